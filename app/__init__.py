@@ -1,31 +1,51 @@
+import logging
 import os
 from flask import Flask
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from app.config import engine_options
+from app.utils.replicas import RoutingSession, init_replicas, replica_binds
 
 # Inisialisasi ekstensi global
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 
 def create_app():
     app = Flask(__name__)
+    logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'))
 
     # Enable CORS untuk semua origin hanya pada /api/*
     CORS(app, resources={
         r"/api/*": {
             "origins": "*",
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization"]
+            "allow_headers": ["Content-Type", "Authorization", "X-DB-Primary-Until"],
+            "expose_headers": ["X-Next-Cursor", "ETag", "X-DB-Primary-Until"]
         }
     })
 
+    # Behind N reverse proxies, trust N X-Forwarded-For hops so remote_addr is the client (rate limits)
+    proxy_count = int(os.getenv('PROXY_COUNT', '0'))
+    if proxy_count:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_count, x_proto=proxy_count)
+
     # Konfigurasi database
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///default.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Signs auth tokens (app/utils/auth.py); must be the same on every worker and stable across restarts
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
+    if not app.config['SECRET_KEY']:
+        logging.getLogger(__name__).warning("SECRET_KEY is not set; using a random key, tokens won't survive a restart")
+        app.config['SECRET_KEY'] = os.urandom(32).hex()
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+    # Optional read replicas (DATABASE_REPLICA_URLS) for GETs; see app/utils/replicas.py
+    app.config['SQLALCHEMY_BINDS'] = replica_binds()
 
     # Init ekstensi
     db.init_app(app)
+    init_replicas(app, db)
     migrate.init_app(app, db)
 
     # Import model agar Alembic tahu
@@ -36,10 +56,32 @@ def create_app():
     from app.routes.feedback.route import feedback_bp
     from app.routes.userLookUp.route import userLookUp
     from app.routes.users.route import users_bp
+    from app.routes.health.route import health_bp
 
     app.register_blueprint(auth_bp, url_prefix="/api/auth")
     app.register_blueprint(feedback_bp, url_prefix="/api/feedback")
     app.register_blueprint(userLookUp, url_prefix="/api/user/lookup")
     app.register_blueprint(users_bp, url_prefix="/api/users")
+    app.register_blueprint(health_bp)
+
+    # Request/SQL/LLM metrics dan endpoint /metrics
+    from app.utils.metrics import init_metrics
+    init_metrics(app)
+
+    # CLI commands (e.g. `flask enrichment worker`)
+    from app.utils.enrichment import enrichment_cli
+    from app.utils.llm_cache import llm_cache_cli
+    from app.utils.stats import stats_cli
+    from app.utils.provisioning import users_cli
+    from app.utils.search import search_cli
+    from app.utils.startup import startup_cli
+    from app.utils.archive import feedback_cli
+    app.cli.add_command(enrichment_cli)
+    app.cli.add_command(llm_cache_cli)
+    app.cli.add_command(stats_cli)
+    app.cli.add_command(users_cli)
+    app.cli.add_command(search_cli)
+    app.cli.add_command(startup_cli)
+    app.cli.add_command(feedback_cli)
 
     return app
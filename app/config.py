@@ -0,0 +1,32 @@
+import os
+
+
+def _env_bool(name, default):
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+def engine_options(database_uri):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS from environment variables, so pool sizing can be tuned
+    per deployment. Pooling matters most for Neon: every new connection over
+    sslmode=require pays a TLS handshake, so connections are kept and reused.
+    """
+    options = {
+        # Test a pooled connection before use; Neon closes idle ones on its side
+        'pool_pre_ping': _env_bool('DB_POOL_PRE_PING', '1'),
+    }
+    if not database_uri.startswith('postgres'):
+        return options
+
+    options.update({
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '5')),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '10')),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', '30')),
+        # Recycle before the server-side idle timeout drops the connection
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '300')),
+    })
+    statement_timeout_ms = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '0'))
+    if statement_timeout_ms:
+        # Not supported through PgBouncer-style poolers (e.g. Neon's -pooler host); leave at 0 there
+        options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout_ms}'}
+    return options
@@ -1,5 +1,11 @@
+from datetime import datetime, timezone
+from sqlalchemy.ext.associationproxy import association_proxy
 from . import db
 
+def utcnow():
+    # Naive UTC timestamp, stored identically by every backend (keyset cursors compare on it)
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -17,15 +23,155 @@ class Feedback(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     # How the anonymous user knows the person (e.g., classmate, colleague)
     anon_identifier = db.Column(db.String(200), nullable=True)
-    feedback_text = db.Column(db.Text, nullable=False)
-    context_text = db.Column(db.Text, nullable=True)
+    # Raw text lives in feedback_content, loaded only when one of these is used
+    content = db.relationship(
+        'FeedbackContent', uselist=False, lazy='select', cascade='all, delete-orphan',
+        primaryjoin='Feedback.id == foreign(FeedbackContent.feedback_id)'
+    )
+    feedback_text = association_proxy('content', 'feedback_text',
+                                      creator=lambda value: FeedbackContent(feedback_text=value))
+    context_text = association_proxy('content', 'context_text',
+                                     creator=lambda value: FeedbackContent(context_text=value))
     # Optional email from the anonymous user
     anon_email = db.Column(db.String(120), nullable=True)
     summary = db.Column(db.Text, nullable=True)  # Summary generated by LLM
-    sentiment = db.Column(db.String(50), nullable=True)  # Sentiment generated by
+    # active_history: the per-user stats listener needs the old value even when the row was expired
+    sentiment = db.column_property(db.Column(db.String(50), nullable=True), active_history=True)  # Sentiment generated by LLM
     constructive_criticism = db.Column(db.Text, nullable=True)  # Constructive criticism generated by LLM
-    is_read = db.Column(db.Boolean, default=False, nullable=False)
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    # Which model / prompt produced the summary, so history can be re-enriched after a switch
+    summary_model_version = db.Column(db.String(100), nullable=True)
+    summary_prompt_version = db.Column(db.String(20), nullable=True)
+    is_read = db.column_property(db.Column(db.Boolean, default=False, nullable=False), active_history=True)
+    # LLM enrichment state: pending -> done / failed (see app/utils/enrichment.py).
+    # New rows start pending; the server default fills rows that predate the column,
+    # which were summarized inline when submitted.
+    enrichment_status = db.Column(db.String(20), default='pending', server_default='done', nullable=False)
+    created_at = db.Column(db.DateTime, default=utcnow, nullable=False)
+
+    __table_args__ = (
+        # Newest-first listing of a user's feedback is a range scan on this index
+        db.Index('ix_feedback_user_created', 'user_id', 'created_at', 'id'),
+        # Postgres: monthly partitions, see app/utils/partitions.py. Partitioned tables can't have
+        # a unique key without created_at, so nothing references feedback.id with a foreign key.
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
+
+    def __repr__(self):
+        return f'<Feedback {self.id} for User {self.user_id}>'
+
+class FeedbackContent(db.Model):
+    # Raw submitted text, kept out of the feedback table so listing and aggregating stay narrow
+    feedback_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    feedback_text = db.Column(db.Text, nullable=False)
+    context_text = db.Column(db.Text, nullable=True)
+
+    def __repr__(self):
+        return f'<FeedbackContent for Feedback {self.feedback_id}>'
+
+class FeedbackArchive(db.Model):
+    # Feedback older than the retention window, moved here by `flask feedback archive`.
+    # The full row is zlib-compressed JSON; the columns beside it are what stats and listing need.
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # Original feedback id
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    sentiment = db.Column(db.String(50), nullable=True)
+    archived_at = db.Column(db.DateTime, default=utcnow, nullable=False)
+    payload = db.Column(db.LargeBinary, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_feedback_archive_user_created', 'user_id', 'created_at', 'id'),
+    )
+
+    def __repr__(self):
+        return f'<FeedbackArchive {self.id} for User {self.user_id}>'
+
+class EnrichmentJob(db.Model):
+    # One job per feedback row, claimed by the background enrichment worker
+    id = db.Column(db.Integer, primary_key=True)
+    feedback_id = db.Column(db.Integer, unique=True, nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, running, done, failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, nullable=False)
+    locked_at = db.Column(db.DateTime, nullable=True)  # Set while a worker holds the job
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=utcnow)
+    feedback = db.relationship('Feedback', primaryjoin='foreign(EnrichmentJob.feedback_id) == Feedback.id',
+                               backref=db.backref('enrichment_job', uselist=False, cascade='all, delete-orphan'))
+
+    __table_args__ = (
+        db.Index('ix_enrichment_job_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    def __repr__(self):
+        return f'<EnrichmentJob {self.id} for Feedback {self.feedback_id} ({self.status})>'
+
+class LLMResultCache(db.Model):
+    # Persistent tier of the LLM result cache, keyed by a hash of the prompt inputs
+    key = db.Column(db.String(64), primary_key=True)  # sha256 hex, see app/utils/llm_cache.py
+    result = db.Column(db.Text, nullable=False)  # JSON with sentiment, summary, constructiveCriticism
+    model_version = db.Column(db.String(100), nullable=False)
+    prompt_version = db.Column(db.String(20), nullable=False)
+    latency_ms = db.Column(db.Integer, nullable=False, default=0)  # Latency of the original LLM call
+    hit_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=utcnow)
+
+    def __repr__(self):
+        return f'<LLMResultCache {self.key[:12]} ({self.model_version})>'
+
+# Per-user feedback aggregates, kept in step with Feedback writes by app/utils/stats.py.
+# `flask stats rebuild` recomputes them from the feedback table.
+class UserFeedbackStats(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    unread = db.Column(db.Integer, nullable=False, default=0)
+    last_feedback_at = db.Column(db.DateTime, nullable=True)
+    # Bumped on every change to this user's feedback; ETags of the feedback list are built from it
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<UserFeedbackStats for User {self.user_id}: {self.total} total, {self.unread} unread>'
+
+class UserSentimentCount(db.Model):
+    # Sentiment labels come from the LLM and are free text, hence one row per (user, label)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    sentiment = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<UserSentimentCount {self.user_id} {self.sentiment}={self.count}>'
+
+class UserFeedbackDaily(db.Model):
+    # Feedback received per user per UTC day
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<UserFeedbackDaily {self.user_id} {self.day}={self.count}>'
+
+# Feedback spam filter state (app/utils/spam.py), in the database so every worker process shares it
+class RateLimitBucket(db.Model):
+    key = db.Column(db.String(80), primary_key=True)  # 'c:<client hash>' or 'u:<user id>'
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False)  # Unix time the tokens were last counted
+
+    def __repr__(self):
+        return f'<RateLimitBucket {self.key}={self.tokens:.1f}>'
+
+class FeedbackSignature(db.Model):
+    # MinHash signature of a recent feedback, for near-duplicate checks per (recipient, sender)
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    client_key = db.Column(db.String(32), nullable=False)  # Hash of the sender address
+    feedback_id = db.Column(db.Integer, nullable=False)
+    signature = db.Column(db.LargeBinary, nullable=False)  # Packed 64-bit hashes
+    created_at = db.Column(db.DateTime, default=utcnow, nullable=False)
+    feedback = db.relationship('Feedback', primaryjoin='foreign(FeedbackSignature.feedback_id) == Feedback.id')
+
+    __table_args__ = (
+        db.Index('ix_feedback_signature_sender', 'user_id', 'client_key', 'created_at'),
+    )
 
     def __repr__(self):
-        return f'<Feedback {self.id} for User {self.user_id}>'
\ No newline at end of file
+        return f'<FeedbackSignature for Feedback {self.feedback_id}>'
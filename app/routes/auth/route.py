@@ -1,8 +1,10 @@
 from flask import Blueprint, request, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
+from itsdangerous import BadSignature, SignatureExpired
 from app.model import User
 from app import db
-from app.utils.uuid import generate_unique_link_id
+from app.utils.auth import (HashPoolBusy, busy_response, hash_password, issue_tokens, load_refresh_token,
+                            verify_password)
+from app.utils.provisioning import insert_user
 
 auth_bp = Blueprint("auth", __name__, url_prefix="/api/auth")
 
@@ -19,25 +21,17 @@ def register_user():
     if not username or not email or not password:
         return jsonify({'message': 'Username, email, and password are required'}), 400
 
-    if User.query.filter_by(username=username).first() is not None:
+    try:
+        hashed_password = hash_password(password)
+    except HashPoolBusy:
+        return busy_response()
+
+    # No pre-check SELECTs: the unique constraints catch duplicates
+    new_user, conflict = insert_user(username=username, email=email, password_hash=hashed_password)
+    if conflict == 'username':
         return jsonify({'message': 'Username already exists'}), 409 # 409 Conflict
-    
-    if User.query.filter_by(email=email).first() is not None:
+    if conflict == 'email':
         return jsonify({'message': 'Email already registered'}), 409
-
-    hashed_password = generate_password_hash(password)
-    new_link_id = generate_unique_link_id()
-    # Ensure link_id is unique (though collision is highly unlikely with UUIDs)
-    while User.query.filter_by(link_id=new_link_id).first() is not None:
-        new_link_id = generate_unique_link_id()
-
-    new_user = User(
-        username=username,
-        email=email,
-        password_hash=hashed_password,
-        link_id=new_link_id
-    )
-    db.session.add(new_user)
     db.session.commit()
 
     return jsonify({
@@ -63,16 +57,40 @@ def login_user():
     # Try to find user by email or username
     user = User.query.filter((User.email == identifier) | (User.username == identifier)).first()
 
-    if user and check_password_hash(user.password_hash, password):
-        # Login successful - In a real app, generate and return a token (e.g., JWT) here
+    try:
+        password_ok = user is not None and verify_password(user.password_hash, password)
+    except HashPoolBusy:
+        return busy_response()
+
+    if password_ok:
+        # Login successful; send the access token as `Authorization: Bearer <token>`
         return jsonify({
             'message': 'Login successful',
             'user_id': user.id,
             'username': user.username,
             'email': user.email,
-            'link_id': user.link_id
-            # Add token here in a real app: 'token': generated_token
+            'link_id': user.link_id,
+            **issue_tokens(user)
         }), 200
     else:
         # Invalid credentials
-        return jsonify({'message': 'Invalid credentials'}), 401
\ No newline at end of file
+        return jsonify({'message': 'Invalid credentials'}), 401
+
+@auth_bp.route('/refresh', methods=['POST'])
+def refresh_token():
+    data = request.get_json(silent=True) or {}
+    token = data.get('refresh_token')
+    if not token:
+        return jsonify({'message': 'Refresh token is required'}), 400
+
+    try:
+        user = load_refresh_token(token, lambda user_id: db.session.get(User, user_id))
+    except SignatureExpired:
+        return jsonify({'message': 'Refresh token expired'}), 401
+    except (BadSignature, KeyError, TypeError):
+        return jsonify({'message': 'Invalid refresh token'}), 401
+    if user is None:
+        return jsonify({'message': 'Invalid refresh token'}), 401
+
+    # New pair; the old refresh token stays valid until it expires
+    return jsonify(issue_tokens(user)), 200
\ No newline at end of file
@@ -1,93 +1,164 @@
-from flask import Blueprint, request, jsonify
+import json
+import logging
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from urllib.parse import unquote
-from app.model import User, Feedback
+from app.model import Feedback
 from app import db
-from app.utils.llm_handler import summarize_text_with_llm
+from app.utils.enrichment import STATUS_PENDING, enqueue_enrichment, llm_input, mark_enriched
+from app.utils.identifier import resolve_user
+from app.utils import spam
+from app.utils.llm_handler import stream_summary, MODEL_TYPE
+
+logger = logging.getLogger(__name__)
 
 feedback_bp = Blueprint('feedback', __name__, url_prefix='/api/feedback')
 
-@feedback_bp.route('/<identifier>', methods=['POST'])
-def submit_feedback(identifier):
-    decoded_identifier = unquote(identifier)
-    user = User.query.filter_by(username=decoded_identifier).first()
-    if not user:
-        user = User.query.filter_by(link_id=decoded_identifier).first()
-    if not user:
-        user = User.query.filter_by(email=decoded_identifier).first()
+def _too_many(retry_after):
+    response = jsonify({'message': 'Terlalu banyak feedback, coba lagi nanti'})
+    response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+    return response, 429
+
+def _validated_submission(identifier):
+    """
+    Returns (user, data, duplicate_of, signature, None) or (..., error_response) for a feedback POST.
+    The client rate limit runs before the user lookup; `duplicate_of` is the id of a recent
+    near-identical feedback from the same client to the same user. Callers then store nothing but answer exactly as
+    for an accepted submission of that feedback, so senders can't probe what others have sent.
+    """
+    retry_after = spam.check_client(request.remote_addr)
+    if retry_after is not None:
+        return None, None, None, None, _too_many(retry_after)
+
+    user = resolve_user(unquote(identifier))
     if not user:
-        return jsonify({'message': 'User not found for the provided identifier'}), 404
+        return None, None, None, None, (jsonify({'message': 'User not found for the provided identifier'}), 404)
 
     data = request.get_json()
     if not data:
-        return jsonify({'message': 'No input data provided'}), 400
+        return None, None, None, None, (jsonify({'message': 'No input data provided'}), 400)
 
-    feedback_text = data.get('feedback_text')
-    if not feedback_text:
-        return jsonify({'message': 'Feedback text is required'}), 400
+    if not data.get('feedback_text'):
+        return None, None, None, None, (jsonify({'message': 'Feedback text is required'}), 400)
+
+    retry_after = spam.check_user(user.id)
+    if retry_after is not None:
+        return None, None, None, None, _too_many(retry_after)
+
+    duplicate_of, signature = spam.find_duplicate(user.id, request.remote_addr, data['feedback_text'])
+    return user, data, duplicate_of, signature, None
+
+def _accepted_payload(feedback_id):
+    # 202: the row is stored, its summary follows from the background worker
+    return {'message': 'Feedback submitted successfully', 'feedback_id': feedback_id,
+            'enrichment_status': STATUS_PENDING}
+
+@feedback_bp.route('/<identifier>', methods=['POST'])
+def submit_feedback(identifier):
+    user, data, duplicate_of, signature, error = _validated_submission(identifier)
+    if error:
+        return error
+    if duplicate_of is not None:
+        # Same feedback already stored by this sender: no new row, no LLM call, their earlier id
+        return jsonify(_accepted_payload(duplicate_of)), 202
 
+    feedback_text = data.get('feedback_text')
     anon_identifier = data.get('anon_identifier')
     context_text = data.get('context_text')
     anon_email = data.get('anon_email')
 
-    # Default values jika LLM gagal
-    default_sentiment = "Netral Aja"
-    default_summary = "Tidak dapat memproses ringkasan saat ini"
-    default_criticism = "Tidak ada saran spesifik saat ini"
-
-    # Prepare data for LLM processing
-    feedback_input_dict = {
-        'anon_identifier': anon_identifier or 'Tidak disebutkan',
-        'context_text': context_text or 'Tidak disebutkan',
-        'feedback_text': feedback_text
-    }
-
-    # Initialize variables for LLM results
-    llm_sentiment = default_sentiment
-    llm_summary = default_summary
-    llm_criticism = default_criticism
-
-    # Process with LLM
-    try:
-        llm_response_dict = summarize_text_with_llm(
-            item_to_summarise=feedback_input_dict,
-            model_provider="anthropic"  # Or get from environment variable
-        )
-        
-        # Extract values from response with proper fallbacks
-        llm_sentiment = llm_response_dict.get("sentiment", default_sentiment)
-        llm_summary = llm_response_dict.get("summary", default_summary)
-        llm_criticism = llm_response_dict.get("constructiveCriticism", default_criticism)
-        
-        # Ensure we have non-empty values
-        if not llm_sentiment or llm_sentiment.strip() == "":
-            llm_sentiment = default_sentiment
-        if not llm_summary or llm_summary.strip() == "":
-            llm_summary = default_summary
-        if not llm_criticism or llm_criticism.strip() == "":
-            llm_criticism = default_criticism
-            
-    except Exception as e:
-        print(f"LLM processing error: {e}")
-        # Keep the default values we already set
-
-    # Create feedback with LLM results
+    # Simpan feedback dulu, ringkasan LLM diproses worker di background
     new_feedback = Feedback(
         user_id=user.id,
         anon_identifier=anon_identifier,
         feedback_text=feedback_text,
         context_text=context_text,
-        anon_email=anon_email,
-        sentiment=llm_sentiment,
-        summary=llm_summary,
-        constructive_criticism=llm_criticism
+        anon_email=anon_email
     )
 
     db.session.add(new_feedback)
+    enqueue_enrichment(new_feedback)
+    spam.remember(user.id, request.remote_addr, signature, new_feedback)
     db.session.commit()
 
-    return jsonify({
-        'message': 'Feedback submitted successfully', 
-        'feedback_id': new_feedback.id,
-    }), 201
+    return jsonify(_accepted_payload(new_feedback.id)), 202
+
+
+
+
+_ACCEPTED_EVENT = {'message': 'Feedback diterima, lagi diringkas...'}
+_SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+_QUEUED_EVENT = {'message': 'Ringkasan belum bisa dibuat sekarang, nanti diproses di background',
+                 'enrichment_status': STATUS_PENDING}
+
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+@feedback_bp.route('/<identifier>/stream', methods=['POST'])
+def stream_feedback(identifier):
+    """
+    Same input as submit_feedback, but the LLM summary is streamed back as Server-Sent Events:
+    `accepted` right away, `delta` events with raw response text as it is generated, then one
+    `result` event (parsed summary) or `error` event. A near-duplicate of a recent submission is
+    not stored and gets `accepted` plus the `error` event of a summary left to the background,
+    the same answer as when the LLM is unavailable. The feedback row is saved
+    once the stream completes; if the LLM fails or the client disconnects it is saved as
+    pending and queued for the background worker like a normal submission.
+    """
+    user, data, duplicate_of, signature, error = _validated_submission(identifier)
+    if error:
+        return error
+    if duplicate_of is not None:
+        return Response(_sse('accepted', _ACCEPTED_EVENT) + _sse('error', _QUEUED_EVENT),
+                        mimetype='text/event-stream', headers=_SSE_HEADERS)
+
+    fields = {
+        'user_id': user.id,
+        'anon_identifier': data.get('anon_identifier'),
+        'feedback_text': data.get('feedback_text'),
+        'context_text': data.get('context_text'),
+        'anon_email': data.get('anon_email'),
+    }
+    item = llm_input(fields['anon_identifier'], fields['context_text'], fields['feedback_text'])
+
+    def save(llm_result):
+        feedback = Feedback(**fields)
+        db.session.add(feedback)
+        if llm_result is not None:
+            mark_enriched(feedback, llm_result)
+        else:
+            enqueue_enrichment(feedback)
+        spam.remember(user.id, request.remote_addr, signature, feedback)
+        db.session.commit()
+        return feedback
+
+    def generate():
+        saved = False
+        try:
+            yield _sse('accepted', _ACCEPTED_EVENT)
+            llm_result = None
+            try:
+                for kind, payload in stream_summary(item, model_provider=MODEL_TYPE):
+                    if kind == 'delta':
+                        yield _sse('delta', {'text': payload})
+                    elif kind == 'result':
+                        llm_result = payload
+            except ValueError as e:
+                logger.error("Streaming summary unavailable: %s", e)
 
+            saved = True
+            feedback = save(llm_result)
+            if llm_result is None:
+                yield _sse('error', _QUEUED_EVENT)
+            else:
+                yield _sse('result', {
+                    'enrichment_status': feedback.enrichment_status,
+                    'sentiment': feedback.sentiment,
+                    'summary': feedback.summary,
+                    'constructiveCriticism': feedback.constructive_criticism,
+                })
+        finally:
+            if not saved:
+                # Client went away mid-stream: keep the feedback and let the worker summarize it
+                save(None)
 
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=_SSE_HEADERS)
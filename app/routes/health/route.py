@@ -0,0 +1,29 @@
+from flask import Blueprint, jsonify
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from app import db
+from app.utils.replicas import replica_status
+
+health_bp = Blueprint('health', __name__)
+
+@health_bp.route('/healthz', methods=['GET'])
+def liveness():
+    # Process is up; does not touch the database
+    return jsonify({'status': 'ok'}), 200
+
+@health_bp.route('/readyz', methods=['GET'])
+def readiness():
+    pool = db.engine.pool
+    pool_state = {'class': type(pool).__name__}
+    for stat in ('size', 'checkedin', 'checkedout', 'overflow'):
+        if hasattr(pool, stat):
+            pool_state[stat] = getattr(pool, stat)()
+
+    try:
+        with db.engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+    except SQLAlchemyError as e:
+        return jsonify({'status': 'unavailable', 'database': str(e), 'pool': pool_state}), 503
+
+    # Replicas are optional: reads fall back to the primary, so they don't affect readiness
+    return jsonify({'status': 'ok', 'database': 'ok', 'pool': pool_state, 'replicas': replica_status(db)}), 200
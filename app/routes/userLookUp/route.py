@@ -1,25 +1,20 @@
 from flask import Blueprint, request, jsonify
-from app.model import User
+from app.utils.identifier import resolve_user
 
 userLookUp = Blueprint('lookup', __name__ , url_prefix='/api/user/')
 
 @userLookUp.route('/<identifier>', methods=['GET'])
 def lookup_user(identifier):
-    # Try to find user by username or link_id or email
-    # user_username = User.query.filter((User.username == identifier)).first()
-    # user_link_id = User.query.filter((User.link_id == identifier)).first()
-    # user_email = User.query.filter((User.email == identifier)).first()
-    user_username = User.query.filter_by(username=identifier).first()
-    user_link_id = User.query.filter_by(link_id=identifier).first()
-    user_email = User.query.filter_by(email=identifier).first()
-    if user_username:
-        return jsonify({'user_identifier': user_username.username}), 200
+    # Try to find user by username or link_id or email (one query, cached)
+    user = resolve_user(identifier)
+    if user is None:
+        # If no user found by username, link_id, or email
+        return jsonify({'message': 'Pengguna tidak ditemukan atau ID tidak valid'}), 404
+    if user.matched_by == 'username':
+        return jsonify({'user_identifier': user.username}), 200
         # legacy format:
         # return jsonify({'link_id': user.link_id}), 200
-    elif user_link_id:
-        return jsonify({'user_identifier': user_link_id.link_id}), 200
-    elif user_email:
-        return jsonify({'user_identifier': user_email.email}), 200
+    elif user.matched_by == 'link_id':
+        return jsonify({'user_identifier': user.link_id}), 200
     else:
-        # If no user found by username, link_id, or email
-        return jsonify({'message': 'Pengguna tidak ditemukan atau ID tidak valid'}), 404
\ No newline at end of file
+        return jsonify({'user_identifier': identifier}), 200
\ No newline at end of file
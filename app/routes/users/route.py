@@ -1,8 +1,19 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, g, request, jsonify
+from sqlalchemy import tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 from urllib.parse import unquote
-from app.model import User, Feedback
+from app.model import User, Feedback, FeedbackArchive
 from app import db
-from app.utils.uuid import generate_unique_link_id
+from app.utils.provisioning import insert_user
+from app.utils.archive import archived_feedback
+from app.utils.auth import token_required
+from app.utils.identifier import resolve_user
+from app.utils.pagination import (decode_cursor, decode_offset_cursor, encode_cursor, encode_offset_cursor,
+                                  parse_limit)
+from app.utils.search import MAX_OFFSET, MAX_QUERY_LENGTH, search_feedback
+from app.utils.stats import apply_read_changes, feedback_version, user_stats
+from app.utils import response_cache
 
 users_bp = Blueprint('users', __name__, url_prefix='/api/users')
 
@@ -12,37 +23,239 @@ def create_user():
     # For now, it remains as a simple way to create a user with just a link_id,
     # but it doesn't set username, email, or password.
     # Consider if this is still needed or how it should interact with the new registration flow.
-    new_link_id = generate_unique_link_id()
-    # Ensure link_id is unique
-    while User.query.filter_by(link_id=new_link_id).first() is not None:
-        new_link_id = generate_unique_link_id()
-    
-    new_user = User(link_id=new_link_id)
-    db.session.add(new_user)
+    try:
+        new_user, _ = insert_user()
+    except IntegrityError:
+        # username, email and password_hash are NOT NULL, so a bare link_id user is rejected
+        db.session.rollback()
+        return jsonify({'message': 'Username, email, and password are required; use /api/auth/register'}), 400
     db.session.commit()
-    return jsonify({'message': 'User created successfully', 'link_id': new_link_id, 'user_id': new_user.id}), 201
+    return jsonify({'message': 'User created successfully', 'link_id': new_user.link_id, 'user_id': new_user.id}), 201
+
+def _own_user(identifier):
+    """Resolves the identifier and checks it is the token's user. Returns (user, None) or (None, error_response)."""
+    user = resolve_user(unquote(identifier))
+    if not user:
+        return None, (jsonify({'message': 'User not found'}), 404)
+    if user.id != g.current_user.id:
+        return None, (jsonify({'message': 'Forbidden'}), 403)
+    return user, None
 
 @users_bp.route('/<identifier>/feedbacks', methods=['GET'])
+@token_required
 def get_user_feedbacks(identifier):
 
-    decoded_identifier = unquote(identifier)
-    user = User.query.filter_by(username=decoded_identifier).first()
-    if not user:
-        user = User.query.filter_by(link_id=decoded_identifier).first()
-    if not user:
-        user = User.query.filter_by(email=decoded_identifier).first()
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
+    user, error = _own_user(identifier)
+    if error:
+        return error
+
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        cursor = request.args.get('cursor')
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    # Polls that find nothing new stop here: one primary-key read, no feedback rows
+    version = feedback_version(user.id)
+    etag = response_cache.make_etag(user.id, version, cursor, limit)
+    if response_cache.not_modified(etag):
+        return response_cache.not_modified_response(etag)
+    cache_key = (user.id, version, cursor, limit)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return response_cache.cached_response(*cached, etag)
+
+    # Only the columns we return, newest first, keyset-paginated on (created_at, id)
+    query = (
+        db.select(
+            Feedback.id,
+            Feedback.created_at,
+            Feedback.user_id,
+            Feedback.sentiment,
+            Feedback.constructive_criticism,
+            Feedback.summary,
+            Feedback.enrichment_status,
+            Feedback.is_read
+        )
+        .where(Feedback.user_id == user.id)
+        .order_by(Feedback.created_at.desc(), Feedback.id.desc())
+        .limit(limit + 1)
+    )
+    if after:
+        query = query.where(tuple_(Feedback.created_at, Feedback.id) < after)
+    feedbacks = db.session.execute(query).all()
 
-    feedbacks = Feedback.query.filter_by(user_id=user.id).all()
+    has_more = len(feedbacks) > limit
+    feedbacks = feedbacks[:limit]
     processed_feedbacks = [
         {
+            'id': fb.id,
             'user_id': fb.user_id,
             'sentiment': fb.sentiment,
             'constructive_criticism': fb.constructive_criticism,
-            'summary': fb.summary
+            'summary': fb.summary,
+            'enrichment_status': fb.enrichment_status,
+            'is_read': fb.is_read
         }
         for fb in feedbacks
     ]
 
-    return jsonify(processed_feedbacks), 200
\ No newline at end of file
+    headers = {}
+    if has_more:
+        # Pass back as ?cursor=... to fetch the next page
+        headers['X-Next-Cursor'] = encode_cursor(feedbacks[-1].created_at, feedbacks[-1].id)
+    body = jsonify(processed_feedbacks).get_data()
+    response_cache.put(cache_key, body, headers)
+    return response_cache.cached_response(body, headers, etag), 200
+
+@users_bp.route('/<identifier>/feedbacks/<int:feedback_id>', methods=['GET'])
+@token_required
+def get_user_feedback(identifier, feedback_id):
+    """One feedback with its raw text, from the live table or else the archive."""
+    user, error = _own_user(identifier)
+    if error:
+        return error
+
+    feedback = db.session.get(Feedback, feedback_id, options=[joinedload(Feedback.content)])
+    if feedback is not None and feedback.user_id == user.id:
+        return jsonify({
+            'id': feedback.id,
+            'user_id': feedback.user_id,
+            'anon_identifier': feedback.anon_identifier,
+            'feedback_text': feedback.feedback_text,
+            'context_text': feedback.context_text,
+            'sentiment': feedback.sentiment,
+            'constructive_criticism': feedback.constructive_criticism,
+            'summary': feedback.summary,
+            'enrichment_status': feedback.enrichment_status,
+            'is_read': feedback.is_read,
+            'created_at': feedback.created_at.isoformat(),
+            'archived': False
+        }), 200
+
+    entry = db.session.get(FeedbackArchive, feedback_id)
+    if entry is not None and entry.user_id == user.id:
+        return jsonify(archived_feedback(entry)), 200
+    return jsonify({'message': 'Feedback not found'}), 404
+
+@users_bp.route('/<identifier>/feedbacks/archive', methods=['GET'])
+@token_required
+def get_user_archived_feedbacks(identifier):
+    """The user's archived feedback with its text, newest first, paginated like /feedbacks."""
+    user, error = _own_user(identifier)
+    if error:
+        return error
+
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        cursor = request.args.get('cursor')
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    query = (
+        db.select(FeedbackArchive)
+        .where(FeedbackArchive.user_id == user.id)
+        .order_by(FeedbackArchive.created_at.desc(), FeedbackArchive.id.desc())
+        .limit(limit + 1)
+    )
+    if after:
+        query = query.where(tuple_(FeedbackArchive.created_at, FeedbackArchive.id) < after)
+    entries = db.session.scalars(query).all()
+
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    response = jsonify([archived_feedback(entry) for entry in entries])
+    if has_more:
+        response.headers['X-Next-Cursor'] = encode_cursor(entries[-1].created_at, entries[-1].id)
+    return response, 200
+
+# Max ids per mark-as-read request
+MAX_MARK_READ = 1000
+
+@users_bp.route('/<identifier>/feedbacks/read', methods=['POST'])
+@token_required
+def mark_feedbacks_read(identifier):
+    """Sets is_read on many of the user's feedback ({"ids": [...], "is_read": true}) with one UPDATE."""
+    user, error = _own_user(identifier)
+    if error:
+        return error
+
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids')
+    is_read = data.get('is_read', True)
+    if (not isinstance(ids, list) or not ids or len(ids) > MAX_MARK_READ
+            or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids)):
+        return jsonify({'message': f'ids must be a list of 1 to {MAX_MARK_READ} feedback ids'}), 400
+    if not isinstance(is_read, bool):
+        return jsonify({'message': 'is_read must be true or false'}), 400
+
+    # Only rows that actually change, so rowcount is the exact unread delta
+    result = db.session.execute(
+        db.update(Feedback)
+        .where(Feedback.user_id == user.id, Feedback.id.in_(set(ids)), Feedback.is_read.is_(not is_read))
+        .values(is_read=is_read)
+        .execution_options(synchronize_session=False)
+    )
+    updated = result.rowcount
+    # The bulk UPDATE bypasses the stats listener: adjust unread and bump the list version here
+    apply_read_changes(user.id, -updated if is_read else updated)
+    db.session.commit()
+    return jsonify({'message': 'Feedback updated', 'updated': updated}), 200
+
+# Max days of daily volume returned by the stats endpoint
+MAX_STATS_DAYS = 365
+
+@users_bp.route('/<identifier>/stats', methods=['GET'])
+@token_required
+def get_user_stats(identifier):
+    """Feedback totals, unread count, sentiment breakdown and daily volume from the aggregate tables."""
+    user, error = _own_user(identifier)
+    if error:
+        return error
+
+    days = request.args.get('days', '30')
+    if not days.isdigit() or not 1 <= int(days) <= MAX_STATS_DAYS:
+        return jsonify({'message': f'days must be an integer between 1 and {MAX_STATS_DAYS}'}), 400
+
+    return jsonify(user_stats(user.id, int(days))), 200
+
+@users_bp.route('/<identifier>/search', methods=['GET'])
+@token_required
+def search_user_feedbacks(identifier):
+    """Full-text search (?q=...) over the user's feedback, best matches first, paginated like /feedbacks."""
+    user, error = _own_user(identifier)
+    if error:
+        return error
+
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({'message': 'Query parameter q is required'}), 400
+    if len(query) > MAX_QUERY_LENGTH:
+        return jsonify({'message': f'q must be at most {MAX_QUERY_LENGTH} characters'}), 400
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        cursor = request.args.get('cursor')
+        offset = decode_offset_cursor(cursor) if cursor else 0
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    rows = search_feedback(user.id, query, limit + 1, offset)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    response = jsonify([
+        {
+            'id': row['id'],
+            'user_id': row['user_id'],
+            'sentiment': row['sentiment'],
+            'constructive_criticism': row['constructive_criticism'],
+            'summary': row['summary'],
+            'enrichment_status': row['enrichment_status'],
+            'rank': row['rank']
+        }
+        for row in rows
+    ])
+    if has_more and offset + limit < MAX_OFFSET:
+        response.headers['X-Next-Cursor'] = encode_offset_cursor(offset + limit)
+    return response, 200
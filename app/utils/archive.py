@@ -0,0 +1,165 @@
+"""
+Archival of old feedback: rows older than FEEDBACK_RETENTION_DAYS move from feedback and
+feedback_content into feedback_archive, one zlib-compressed JSON payload per row.
+
+`flask feedback archive` works in batches, oldest first, one transaction per batch:
+insert the archive rows, delete the enrichment job, content and feedback rows, and
+report the move to the per-user stats (archived rows keep counting in totals but no
+longer as unread). On Postgres it then drops the monthly partitions it emptied
+(app/utils/partitions.py), so the space comes back without waiting for vacuum.
+Archived feedback is left out of listing and search and served only by id or through
+the archive listing (see app/routes/users/route.py).
+"""
+import json
+import os
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import insert
+
+from app import db
+from app.model import EnrichmentJob, Feedback, FeedbackArchive, FeedbackContent, utcnow
+from app.utils.partitions import PARTITION_MONTHS_AHEAD, drop_empty_partitions, ensure_partitions
+from app.utils.stats import apply_archived
+from app.utils.storage_migration import StorageMigrationError, migrate_storage, rollback_storage
+
+FEEDBACK_RETENTION_DAYS = int(os.getenv("FEEDBACK_RETENTION_DAYS", "365"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+COMPRESSION_LEVEL = 6
+
+# Everything needed to serve the row again; the payload is the only copy of the text
+_FEEDBACK_COLUMNS = (
+    Feedback.id, Feedback.user_id, Feedback.anon_identifier, Feedback.anon_email, Feedback.summary,
+    Feedback.sentiment, Feedback.constructive_criticism, Feedback.summary_model_version,
+    Feedback.summary_prompt_version, Feedback.is_read, Feedback.enrichment_status, Feedback.created_at,
+)
+
+
+def pack(values):
+    """Compressed payload of one feedback row (a dict of its columns and text)."""
+    data = {key: value.isoformat() if isinstance(value, datetime) else value for key, value in values.items()}
+    return zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'), COMPRESSION_LEVEL)
+
+
+def unpack(payload):
+    return json.loads(zlib.decompress(payload).decode('utf-8'))
+
+
+def archive_feedback(older_than_days=FEEDBACK_RETENTION_DAYS, batch_size=ARCHIVE_BATCH_SIZE,
+                     max_rows=None, progress=None):
+    """
+    Moves feedback created more than `older_than_days` ago into the archive. Commits each
+    batch. Returns (rows_archived, partitions_dropped).
+    """
+    cutoff = utcnow() - timedelta(days=older_than_days)
+    archived = 0
+    while max_rows is None or archived < max_rows:
+        limit = batch_size if max_rows is None else min(batch_size, max_rows - archived)
+        rows = db.session.execute(
+            db.select(*_FEEDBACK_COLUMNS, FeedbackContent.feedback_text, FeedbackContent.context_text)
+            .outerjoin(FeedbackContent, FeedbackContent.feedback_id == Feedback.id)
+            .where(Feedback.created_at < cutoff)
+            .order_by(Feedback.created_at, Feedback.id)
+            .limit(limit)
+        ).all()
+        if not rows:
+            break
+        ids = [row.id for row in rows]
+        now = utcnow()
+        db.session.execute(insert(FeedbackArchive), [
+            {'id': row.id, 'user_id': row.user_id, 'created_at': row.created_at, 'sentiment': row.sentiment,
+             'archived_at': now, 'payload': pack(row._asdict())}
+            for row in rows
+        ])
+        # Content first: on SQLite its delete trigger is the one that still finds both halves for the FTS row
+        for model, column in ((EnrichmentJob, EnrichmentJob.feedback_id),
+                              (FeedbackContent, FeedbackContent.feedback_id),
+                              (Feedback, Feedback.id)):
+            query = db.delete(model).where(column.in_(ids))
+            if model is Feedback:
+                # Lets Postgres prune to the partitions that can hold these rows
+                query = query.where(Feedback.created_at < cutoff)
+            db.session.execute(query.execution_options(synchronize_session=False))
+
+        unread = Counter()
+        for row in rows:
+            unread[row.user_id] += 0 if row.is_read else 1
+        apply_archived(unread)
+        db.session.commit()
+        archived += len(rows)
+        if progress:
+            progress(archived)
+
+    dropped = drop_empty_partitions(db.session.connection(), cutoff.date())
+    db.session.commit()
+    return archived, dropped
+
+
+def archived_feedback(entry):
+    """API representation of a FeedbackArchive row, same fields as live feedback detail."""
+    data = unpack(entry.payload)
+    return {
+        'id': entry.id,
+        'user_id': entry.user_id,
+        'anon_identifier': data.get('anon_identifier'),
+        'feedback_text': data.get('feedback_text'),
+        'context_text': data.get('context_text'),
+        'sentiment': data.get('sentiment'),
+        'constructive_criticism': data.get('constructive_criticism'),
+        'summary': data.get('summary'),
+        'enrichment_status': data.get('enrichment_status'),
+        'is_read': data.get('is_read'),
+        'created_at': entry.created_at.isoformat(),
+        'archived': True
+    }
+
+
+feedback_cli = AppGroup('feedback', help='Feedback storage: archival, partitions and conversion.')
+
+
+@feedback_cli.command('archive')
+@click.option('--older-than-days', default=FEEDBACK_RETENTION_DAYS, show_default=True,
+              help='Archive feedback created more than this many days ago.')
+@click.option('--batch-size', default=ARCHIVE_BATCH_SIZE, show_default=True, help='Rows moved per transaction.')
+@click.option('--limit', 'max_rows', type=int, default=None, help='Stop after this many rows.')
+def archive_command(older_than_days, batch_size, max_rows):
+    """Move old feedback into compressed archive storage."""
+    archived, dropped = archive_feedback(older_than_days, batch_size, max_rows,
+                                         progress=lambda n: click.echo(f"{n} rows archived"))
+    click.echo(f"Archive done: {archived} rows archived")
+    if dropped:
+        click.echo(f"Dropped empty partitions: {', '.join(dropped)}")
+
+
+@feedback_cli.command('partitions')
+@click.option('--months-ahead', default=PARTITION_MONTHS_AHEAD, show_default=True,
+              help='Create monthly partitions up to this many months ahead.')
+def partitions_command(months_ahead):
+    """Create upcoming monthly feedback partitions (Postgres)."""
+    with db.engine.begin() as connection:
+        if connection.dialect.name != 'postgresql':
+            click.echo(f"Feedback is not partitioned on {connection.dialect.name}; nothing to do")
+            return
+        created = ensure_partitions(connection, months_ahead)
+    click.echo(f"Created partitions: {', '.join(created)}" if created else "All partitions exist")
+
+
+@feedback_cli.command('migrate-storage')
+@click.option('--i-have-a-backup', 'has_backup', is_flag=True,
+              help='Confirm a current backup exists; required, the conversion rewrites the whole table.')
+@click.option('--rollback', is_flag=True, help='Restore the plain table kept by an earlier conversion.')
+def migrate_storage_command(has_backup, rollback):
+    """Convert feedback to monthly partitions on Postgres (see app/utils/storage_migration.py)."""
+    if not has_backup:
+        raise click.UsageError("This locks feedback against reads and writes while it copies the whole table. "
+                               "Take a backup and stop the app first, then pass --i-have-a-backup.")
+    try:
+        with db.engine.begin() as connection:
+            steps = rollback_storage(connection) if rollback else migrate_storage(connection)
+    except StorageMigrationError as e:
+        raise click.ClickException(str(e)) from e
+    for step in steps:
+        click.echo(step)
@@ -0,0 +1,132 @@
+"""
+Stateless signed-token authentication and bounded password hashing.
+
+Login issues a short-lived access token and a longer-lived refresh token, both
+signed with SECRET_KEY (itsdangerous), so protected routes verify a request
+without touching the database or re-running the password hash. Refresh tokens
+carry a fingerprint of the password hash: changing the password invalidates them.
+
+Password hashing/verification is CPU-heavy on purpose, so it runs on a small
+thread pool with a bounded queue. The queue defaults to the request threads per
+process (GUNICORN_THREADS), so under gunicorn every request thread can hold a slot
+and bursts simply wait their turn. When the slots are all taken anyway (more
+request threads than that, e.g. a credential-stuffing burst on another server),
+callers wait up to AUTH_HASH_SLOT_WAIT seconds for one, then get HashPoolBusy and
+answer 503. A slot stays taken until its hash has actually finished, even if the
+caller gave up waiting, so abandoned hashes can't pile up in the pool.
+"""
+import hashlib
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from functools import wraps
+
+from flask import current_app, g, jsonify, request
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from werkzeug.security import check_password_hash, generate_password_hash
+
+ACCESS_TOKEN_TTL = int(os.getenv("AUTH_ACCESS_TOKEN_TTL", "900"))  # 15 minutes
+REFRESH_TOKEN_TTL = int(os.getenv("AUTH_REFRESH_TOKEN_TTL", str(14 * 24 * 3600)))
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", str(min(2, os.cpu_count() or 1))))
+# Hash jobs allowed to wait for a worker: one per request thread by default
+AUTH_HASH_QUEUE = int(os.getenv("AUTH_HASH_QUEUE", os.getenv("GUNICORN_THREADS", "4")))
+# Seconds a caller waits for a free slot, then for its hash to finish, before answering 503
+AUTH_HASH_SLOT_WAIT = float(os.getenv("AUTH_HASH_SLOT_WAIT", "3"))
+AUTH_HASH_TIMEOUT = float(os.getenv("AUTH_HASH_TIMEOUT", "10"))
+# Seconds suggested to clients in Retry-After when the pool is saturated
+AUTH_RETRY_AFTER = 2
+
+TokenUser = namedtuple('TokenUser', ['id', 'username'])
+
+_hash_executor = ThreadPoolExecutor(max_workers=AUTH_HASH_WORKERS, thread_name_prefix="pwhash")
+_hash_slots = threading.BoundedSemaphore(AUTH_HASH_WORKERS + AUTH_HASH_QUEUE)
+
+
+class HashPoolBusy(Exception):
+    """Raised when the password hashing pool is saturated."""
+
+
+def _run_hash(fn, *args):
+    if not _hash_slots.acquire(timeout=AUTH_HASH_SLOT_WAIT):
+        raise HashPoolBusy()
+    try:
+        future = _hash_executor.submit(fn, *args)
+    except BaseException:
+        _hash_slots.release()
+        raise
+    # Released when the hash finishes, not when this caller stops waiting for it
+    future.add_done_callback(lambda _: _hash_slots.release())
+    try:
+        return future.result(timeout=AUTH_HASH_TIMEOUT)
+    except FuturesTimeout:
+        raise HashPoolBusy()
+
+
+def hash_password(password):
+    return _run_hash(generate_password_hash, password)
+
+
+def verify_password(password_hash, password):
+    return _run_hash(check_password_hash, password_hash, password)
+
+
+def busy_response():
+    response = jsonify({'message': 'Server sedang sibuk, coba lagi sebentar lagi'})
+    response.headers['Retry-After'] = str(AUTH_RETRY_AFTER)
+    return response, 503
+
+
+def _serializer(kind):
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=f'auth-{kind}')
+
+
+def _password_fingerprint(password_hash):
+    return hashlib.sha256(password_hash.encode('utf-8')).hexdigest()[:16]
+
+
+def issue_tokens(user):
+    """Access + refresh token pair for a User, in the shape login and refresh return."""
+    access = _serializer('access').dumps({'uid': user.id, 'username': user.username})
+    refresh = _serializer('refresh').dumps({'uid': user.id, 'pwd': _password_fingerprint(user.password_hash)})
+    return {
+        'access_token': access,
+        'refresh_token': refresh,
+        'token_type': 'Bearer',
+        'expires_in': ACCESS_TOKEN_TTL,
+    }
+
+
+def load_access_token(token):
+    """Returns the TokenUser for a valid access token. Raises SignatureExpired / BadSignature."""
+    payload = _serializer('access').loads(token, max_age=ACCESS_TOKEN_TTL)
+    return TokenUser(payload['uid'], payload['username'])
+
+
+def load_refresh_token(token, get_user):
+    """
+    Returns the User a valid refresh token belongs to, or None if the user is gone or
+    changed their password. `get_user(user_id)` loads the user. Raises like load_access_token.
+    """
+    payload = _serializer('refresh').loads(token, max_age=REFRESH_TOKEN_TTL)
+    user = get_user(payload['uid'])
+    if user is None or payload.get('pwd') != _password_fingerprint(user.password_hash):
+        return None
+    return user
+
+
+def token_required(view):
+    """Requires `Authorization: Bearer <access token>`; the caller is available as g.current_user."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not token:
+            return jsonify({'message': 'Authorization token is required'}), 401
+        try:
+            g.current_user = load_access_token(token.strip())
+        except SignatureExpired:
+            return jsonify({'message': 'Token expired'}), 401
+        except (BadSignature, KeyError, TypeError):
+            return jsonify({'message': 'Invalid token'}), 401
+        return view(*args, **kwargs)
+    return wrapper
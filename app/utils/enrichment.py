@@ -0,0 +1,423 @@
+"""
+Background LLM enrichment for submitted feedback.
+
+Feedback rows are committed immediately with enrichment_status='pending' and an
+EnrichmentJob row. A worker process (`flask enrichment worker`) claims pending
+jobs from the database, calls the LLM with bounded concurrency and writes the
+sentiment/summary/constructive_criticism back, retrying with exponential backoff.
+"""
+import json
+import logging
+import os
+import random
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import or_, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import joinedload
+
+from app import db
+from app.model import Feedback, FeedbackContent, EnrichmentJob, utcnow
+from app.utils.stats import apply_bulk_updates
+from app.utils.llm_handler import summarize_text_with_llm, is_llm_error, MODEL_TYPE, PROMPT_VERSION
+from app.utils.llm_providers import get_engine
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+# Default values jika LLM gagal
+DEFAULT_SENTIMENT = "Netral Aja"
+DEFAULT_SUMMARY = "Tidak dapat memproses ringkasan saat ini"
+DEFAULT_CRITICISM = "Tidak ada saran spesifik saat ini"
+
+MAX_ATTEMPTS = int(os.getenv("ENRICHMENT_MAX_ATTEMPTS", "5"))
+BACKOFF_BASE_SECONDS = float(os.getenv("ENRICHMENT_BACKOFF_SECONDS", "5"))
+BACKOFF_MAX_SECONDS = float(os.getenv("ENRICHMENT_BACKOFF_MAX_SECONDS", "600"))
+# A running job whose worker died is handed out again after this lease expires
+LEASE_SECONDS = int(os.getenv("ENRICHMENT_LEASE_SECONDS", "300"))
+CONCURRENCY = int(os.getenv("ENRICHMENT_CONCURRENCY", "4"))
+
+
+def enqueue_enrichment(feedback):
+    """Adds an enrichment job for a (new) feedback row to the current session. Caller commits."""
+    feedback.enrichment_status = STATUS_PENDING
+    job = EnrichmentJob(feedback=feedback, status=STATUS_PENDING, next_attempt_at=utcnow())
+    db.session.add(job)
+    return job
+
+
+def backoff_delay(attempts):
+    """Exponential backoff with jitter for the given number of failed attempts."""
+    delay = min(BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)), BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def claim_jobs(limit):
+    """
+    Claims up to `limit` due jobs and returns their ids.
+
+    Each job is claimed with a conditional UPDATE on its current status, so two
+    workers racing for the same row cannot both win, on Postgres and SQLite alike.
+    """
+    if limit <= 0:
+        return []
+    now = utcnow()
+    stale_before = now - timedelta(seconds=LEASE_SECONDS)
+    candidates = db.session.execute(
+        db.select(EnrichmentJob.id, EnrichmentJob.status)
+        .where(
+            ((EnrichmentJob.status == STATUS_PENDING) & (EnrichmentJob.next_attempt_at <= now))
+            | ((EnrichmentJob.status == STATUS_RUNNING) & (EnrichmentJob.locked_at < stale_before))
+        )
+        .order_by(EnrichmentJob.next_attempt_at)
+        .limit(limit)
+    ).all()
+
+    claimed = []
+    for job_id, status in candidates:
+        stmt = (
+            update(EnrichmentJob)
+            .where(EnrichmentJob.id == job_id, EnrichmentJob.status == status)
+            .values(status=STATUS_RUNNING, locked_at=now)
+        )
+        if status == STATUS_RUNNING:
+            stmt = stmt.where(EnrichmentJob.locked_at < stale_before)
+        if db.session.execute(stmt).rowcount == 1:
+            claimed.append(job_id)
+    db.session.commit()
+    return claimed
+
+
+def llm_input(anon_identifier, context_text, feedback_text):
+    """The dict summarize_text_with_llm expects for one feedback row."""
+    return {
+        'anon_identifier': anon_identifier or 'Tidak disebutkan',
+        'context_text': context_text or 'Tidak disebutkan',
+        'feedback_text': feedback_text
+    }
+
+
+def enrichment_values(llm_response_dict):
+    """Feedback column values for an LLM result, falling back to defaults for empty values."""
+    llm_sentiment = llm_response_dict.get("sentiment") or ""
+    llm_summary = llm_response_dict.get("summary") or ""
+    llm_criticism = llm_response_dict.get("constructiveCriticism") or ""
+
+    return {
+        'sentiment': llm_sentiment if llm_sentiment.strip() else DEFAULT_SENTIMENT,
+        'summary': llm_summary if llm_summary.strip() else DEFAULT_SUMMARY,
+        'constructive_criticism': llm_criticism if llm_criticism.strip() else DEFAULT_CRITICISM,
+    }
+
+
+def _apply_result(feedback, llm_response_dict, model_version=None, prompt_version=None):
+    for column, value in enrichment_values(llm_response_dict).items():
+        setattr(feedback, column, value)
+    feedback.summary_model_version = model_version
+    feedback.summary_prompt_version = prompt_version
+
+
+def mark_enriched(feedback, llm_response_dict, model_version=None, prompt_version=PROMPT_VERSION):
+    """
+    Stores a successful LLM result on the feedback row. Caller commits. The model version
+    defaults to the one that answered (a failover provider's, if it came to that).
+    """
+    model_version = model_version or llm_response_dict.get("modelVersion")
+    _apply_result(feedback, llm_response_dict, model_version, prompt_version)
+    feedback.enrichment_status = STATUS_DONE
+
+
+def process_job(job_id, model_provider=None):
+    """Runs the LLM for a claimed job and records success, a scheduled retry or final failure."""
+    # The raw text is needed here, so fetch it with the row instead of lazily
+    job = db.session.get(EnrichmentJob, job_id,
+                         options=[joinedload(EnrichmentJob.feedback).joinedload(Feedback.content)])
+    if job is None or job.status != STATUS_RUNNING:
+        return None
+    feedback = job.feedback
+    if feedback is None:
+        # No foreign key to feedback (it is partitioned), so the row can be gone, e.g. archived
+        logger.warning("Enrichment job %s has no feedback %s; marking it failed", job.id, job.feedback_id)
+        job.status = STATUS_FAILED
+        job.locked_at = None
+        job.last_error = "Feedback no longer exists"
+        db.session.commit()
+        return STATUS_FAILED
+
+    feedback_input_dict = llm_input(feedback.anon_identifier, feedback.context_text, feedback.feedback_text)
+    # Don't hold a transaction (and its locks) open for the duration of the LLM call
+    db.session.commit()
+
+    error = None
+    try:
+        llm_response_dict = summarize_text_with_llm(
+            item_to_summarise=feedback_input_dict,
+            model_provider=model_provider or MODEL_TYPE
+        )
+        if is_llm_error(llm_response_dict):
+            error = llm_response_dict.get("summary") or "LLM returned an error result"
+    except Exception as e:
+        error = str(e)
+
+    job.attempts += 1
+    job.locked_at = None
+    if error is None:
+        mark_enriched(feedback, llm_response_dict)
+        job.status = STATUS_DONE
+        job.last_error = None
+    elif job.attempts >= MAX_ATTEMPTS:
+        logger.error("Enrichment failed permanently for feedback %s: %s", feedback.id, error)
+        _apply_result(feedback, {})
+        feedback.enrichment_status = STATUS_FAILED
+        job.status = STATUS_FAILED
+        job.last_error = error
+    else:
+        job.status = STATUS_PENDING
+        job.last_error = error
+        job.next_attempt_at = utcnow() + timedelta(seconds=backoff_delay(job.attempts))
+    try:
+        db.session.commit()
+    except SQLAlchemyError as e:
+        # Could not write the result; hand the job back instead of leaving it locked until the lease expires
+        db.session.rollback()
+        db.session.execute(
+            update(EnrichmentJob)
+            .where(EnrichmentJob.id == job_id)
+            .values(status=STATUS_PENDING, locked_at=None, last_error=str(e),
+                    next_attempt_at=utcnow() + timedelta(seconds=backoff_delay(1)))
+        )
+        db.session.commit()
+        return STATUS_PENDING
+    return job.status
+
+
+def _run_in_context(app, job_id, model_provider):
+    with app.app_context():
+        try:
+            return process_job(job_id, model_provider)
+        finally:
+            db.session.remove()
+
+
+def run_worker(app, concurrency=CONCURRENCY, poll_interval=1.0, model_provider=None, once=False):
+    """
+    Claims and processes jobs until stopped, never running more than `concurrency`
+    LLM calls at a time. With once=True it returns when no due jobs are left.
+    """
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    try:
+        signal.signal(signal.SIGTERM, _stop)
+    except ValueError:
+        pass  # Not in the main thread; rely on KeyboardInterrupt / `once`
+
+    processed = 0
+    in_flight = set()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        try:
+            while not stopping:
+                with app.app_context():
+                    job_ids = claim_jobs(concurrency - len(in_flight))
+                    db.session.remove()
+                for job_id in job_ids:
+                    in_flight.add(executor.submit(_run_in_context, app, job_id, model_provider))
+
+                if not in_flight:
+                    if once:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                done, in_flight = wait(in_flight, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    processed += 1
+                    if future.exception() is not None:
+                        logger.error("Enrichment worker error: %s", future.exception())
+        except KeyboardInterrupt:
+            pass
+        wait(in_flight)
+    return processed
+
+
+# Summaries written when enrichment failed, either by the worker or by older code
+FALLBACK_SUMMARIES = (DEFAULT_SUMMARY, "Could not process feedback.")
+
+BACKFILL_SCOPES = ('failed', 'stale')
+
+
+def backfill_filter(scope, model_provider=None):
+    """
+    WHERE clause selecting rows to re-enrich. 'failed' picks rows stuck on fallback
+    values; 'stale' additionally picks anything not produced by the current model/prompt
+    of `model_provider` (MODEL_TYPE by default), including rows a failover provider answered.
+    """
+    failed = or_(
+        Feedback.enrichment_status == STATUS_FAILED,
+        Feedback.sentiment == "Error",
+        Feedback.summary.in_(FALLBACK_SUMMARIES)
+    )
+    if scope == 'failed':
+        condition = failed
+    else:
+        condition = or_(
+            failed,
+            Feedback.summary_model_version.is_(None),
+            Feedback.summary_model_version != get_engine().get(model_provider or MODEL_TYPE).model_version,
+            Feedback.summary_prompt_version != PROMPT_VERSION
+        )
+    # Rows still queued belong to the worker
+    return condition & (Feedback.enrichment_status != STATUS_PENDING)
+
+
+def _summarize_row(app, row, model_provider):
+    with app.app_context():
+        try:
+            result = summarize_text_with_llm(
+                item_to_summarise=llm_input(row.anon_identifier, row.context_text, row.feedback_text),
+                model_provider=model_provider or MODEL_TYPE
+            )
+            return None if is_llm_error(result) else result
+        except Exception as e:
+            logger.error("Backfill LLM error for feedback %s: %s", row.id, e)
+            return None
+        finally:
+            db.session.remove()
+
+
+def _load_checkpoint(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f).get('last_id', 0)
+    return 0
+
+
+def _save_checkpoint(path, last_id):
+    if path:
+        with open(path, 'w') as f:
+            json.dump({'last_id': last_id}, f)
+
+
+def backfill(app, scope='failed', chunk_size=100, concurrency=CONCURRENCY, model_provider=None,
+             checkpoint_path=None, max_rows=None, progress=None):
+    """
+    Re-enriches matching feedback rows in id order, `chunk_size` at a time with up to
+    `concurrency` LLM calls in flight, writing each chunk back with one bulk UPDATE.
+    The last processed id is written to `checkpoint_path` after every chunk, so an
+    interrupted run resumes where it stopped. Returns (rows_seen, rows_updated, seconds).
+    """
+    last_id = _load_checkpoint(checkpoint_path)
+    seen = updated = 0
+    started = time.perf_counter()
+    condition = backfill_filter(scope, model_provider)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while max_rows is None or seen < max_rows:
+            limit = chunk_size if max_rows is None else min(chunk_size, max_rows - seen)
+            rows = db.session.execute(
+                db.select(
+                    Feedback.id, Feedback.user_id, Feedback.sentiment,
+                    Feedback.anon_identifier, FeedbackContent.context_text, FeedbackContent.feedback_text
+                )
+                .join(FeedbackContent, FeedbackContent.feedback_id == Feedback.id)
+                .where(condition, Feedback.id > last_id)
+                .order_by(Feedback.id)
+                .limit(limit)
+            ).all()
+            if not rows:
+                # Finished: the next run starts over from the first matching row
+                if checkpoint_path and os.path.exists(checkpoint_path):
+                    os.remove(checkpoint_path)
+                break
+            # End the read transaction so worker threads can write cache entries meanwhile
+            db.session.commit()
+
+            results = list(executor.map(lambda row: _summarize_row(app, row, model_provider), rows))
+            updates = []
+            sentiment_changes = []
+            for row, result in zip(rows, results):
+                if result is None:
+                    continue
+                values = enrichment_values(result)
+                updates.append(dict(id=row.id, enrichment_status=STATUS_DONE, summary_model_version=result.get("modelVersion"),
+                                    summary_prompt_version=PROMPT_VERSION, **values))
+                sentiment_changes.append((row.user_id, row.sentiment, values['sentiment']))
+            if updates:
+                db.session.execute(update(Feedback), updates)
+                # The bulk UPDATE bypasses the stats flush listener
+                apply_bulk_updates(sentiment_changes)
+                db.session.execute(
+                    update(EnrichmentJob)
+                    .where(EnrichmentJob.feedback_id.in_([u['id'] for u in updates]))
+                    .values(status=STATUS_DONE, last_error=None)
+                )
+            db.session.commit()
+
+            seen += len(rows)
+            updated += len(updates)
+            last_id = rows[-1].id
+            _save_checkpoint(checkpoint_path, last_id)
+            if progress:
+                progress(seen, updated, time.perf_counter() - started)
+
+    return seen, updated, time.perf_counter() - started
+
+
+enrichment_cli = AppGroup('enrichment', help='Background LLM enrichment of feedback.')
+
+
+@enrichment_cli.command('worker')
+@click.option('--concurrency', default=CONCURRENCY, show_default=True, help='Maximum number of concurrent LLM calls.')
+@click.option('--poll-interval', default=1.0, show_default=True, help='Seconds to wait when the queue is empty.')
+@click.option('--provider', default=None, help='LLM provider override (e.g. "fake" for offline runs).')
+@click.option('--once', is_flag=True, help='Exit once no due jobs are left instead of polling forever.')
+def worker_command(concurrency, poll_interval, provider, once):
+    """Run the enrichment worker in this process."""
+    app = current_app._get_current_object()
+    click.echo(f"Enrichment worker started (concurrency={concurrency})")
+    processed = run_worker(app, concurrency=concurrency, poll_interval=poll_interval,
+                           model_provider=provider, once=once)
+    click.echo(f"Enrichment worker stopped, {processed} job(s) processed")
+
+
+@enrichment_cli.command('backfill')
+@click.option('--scope', type=click.Choice(BACKFILL_SCOPES), default='failed', show_default=True,
+              help='"failed": rows stuck on fallback values. "stale": also rows from another model/prompt version.')
+@click.option('--chunk-size', default=100, show_default=True, help='Rows fetched and written back per batch.')
+@click.option('--concurrency', default=CONCURRENCY, show_default=True, help='Maximum number of concurrent LLM calls.')
+@click.option('--provider', default=None, help='LLM provider override (e.g. "fake" for offline runs).')
+@click.option('--checkpoint', 'checkpoint_path', default=None,
+              help='Checkpoint file. Defaults to instance/backfill-<scope>.json.')
+@click.option('--reset', is_flag=True, help='Ignore an existing checkpoint and start from the first row.')
+@click.option('--limit', 'max_rows', type=int, default=None, help='Stop after this many rows.')
+def backfill_command(scope, chunk_size, concurrency, provider, checkpoint_path, reset, max_rows):
+    """Re-summarize failed or outdated feedback in bulk."""
+    app = current_app._get_current_object()
+    if checkpoint_path is None:
+        os.makedirs(app.instance_path, exist_ok=True)
+        checkpoint_path = os.path.join(app.instance_path, f'backfill-{scope}.json')
+    if reset and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    def progress(seen, updated, elapsed):
+        rate = seen / elapsed * 60 if elapsed else 0.0
+        click.echo(f"{seen} rows processed, {updated} updated ({rate:.0f} rows/min)")
+
+    seen, updated, elapsed = backfill(app, scope=scope, chunk_size=chunk_size, concurrency=concurrency,
+                                      model_provider=provider, checkpoint_path=checkpoint_path,
+                                      max_rows=max_rows, progress=progress)
+    rate = seen / elapsed * 60 if elapsed else 0.0
+    click.echo(f"Backfill done: {seen} rows processed, {updated} updated in {elapsed:.1f}s ({rate:.0f} rows/min)")
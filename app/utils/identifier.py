@@ -0,0 +1,65 @@
+"""
+Resolves the public identifier used in URLs (username, link_id or email) to a user.
+
+All three columns are checked in one OR'd query and the match is picked with the
+same precedence the routes always used: username, then link_id, then email.
+Results are kept in a per-process LRU/TTL cache. Writes to a User drop the affected
+entries in this process; other processes see the change once the TTL expires.
+"""
+import os
+from collections import namedtuple
+
+from sqlalchemy import event, or_
+
+from app import db
+from app.model import User
+from app.utils.cache import TTLCache
+
+ResolvedUser = namedtuple('ResolvedUser', ['id', 'username', 'link_id', 'matched_by'])
+
+# Lookup order when one identifier matches several users
+MATCH_PRECEDENCE = ('username', 'link_id', 'email')
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "300"))
+
+_user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+
+def resolve_user(identifier):
+    """Returns a ResolvedUser for the identifier, or None if no user matches."""
+    if not identifier:
+        return None
+    cached = _user_cache.get(identifier)
+    if cached is not None:
+        return cached
+
+    rows = db.session.execute(
+        db.select(User.id, User.username, User.link_id, User.email)
+        .where(or_(User.username == identifier, User.link_id == identifier, User.email == identifier))
+    ).all()
+
+    for field in MATCH_PRECEDENCE:
+        for row in rows:
+            if getattr(row, field) == identifier:
+                resolved = ResolvedUser(row.id, row.username, row.link_id, field)
+                _user_cache.set(identifier, resolved)
+                return resolved
+    return None
+
+
+def user_cache_stats():
+    return _user_cache.stats()
+
+
+def invalidate_user(user):
+    """Drops cached entries for this user and for any identifier it now answers to."""
+    keys = {user.username, user.link_id, user.email}
+    _user_cache.discard_where(lambda key, value: value.id == user.id or key in keys)
+
+
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_on_user_write(mapper, connection, target):
+    invalidate_user(target)
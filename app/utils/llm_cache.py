@@ -0,0 +1,162 @@
+"""
+Content-addressed cache for LLM summarization results.
+
+The key is a sha256 over the normalized prompt inputs plus provider, model and
+prompt version, so resubmits, double-clicks and copy-pasted spam reuse the first
+result instead of paying for another call. Lookups go through an in-process LRU
+tier first and the LLMResultCache table second. Only successful results from the
+requested provider and model are stored (see llm_handler._cacheable); each records
+the provider and model that produced it.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import click
+from flask import has_app_context
+from flask.cli import AppGroup
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from app import db
+from app.model import LLMResultCache, utcnow
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "2048"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "86400"))
+
+_memory = TTLCache(maxsize=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL)
+_stats_lock = threading.Lock()
+_stats = {'memory_hits': 0, 'db_hits': 0, 'misses': 0, 'stores': 0, 'saved_latency_ms': 0}
+
+
+def _normalize(text):
+    return " ".join((text or "").split())
+
+
+def make_key(item_to_summarise, model_provider, model_version, prompt_version):
+    """sha256 hex over the normalized feedback fields and the model/prompt that would process them."""
+    payload = json.dumps([
+        _normalize(item_to_summarise.get('anon_identifier')).casefold(),
+        _normalize(item_to_summarise.get('context_text')),
+        _normalize(item_to_summarise.get('feedback_text')),
+        model_provider,
+        model_version,
+        prompt_version,
+    ], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _record(counter, saved_latency_ms=0):
+    with _stats_lock:
+        _stats[counter] += 1
+        _stats['saved_latency_ms'] += saved_latency_ms
+
+
+def get(key):
+    """Returns the cached result dict for the key, or None on a miss."""
+    if not LLM_CACHE_ENABLED:
+        return None
+    entry = _memory.get(key)
+    if entry is not None:
+        result, latency_ms = entry
+        _record('memory_hits', latency_ms)
+        return dict(result)
+
+    if has_app_context():
+        try:
+            # Own short transaction: callers may hold theirs open across the LLM call
+            with db.engine.begin() as conn:
+                row = conn.execute(
+                    db.select(LLMResultCache.result, LLMResultCache.latency_ms).where(LLMResultCache.key == key)
+                ).first()
+                if row is not None:
+                    conn.execute(
+                        update(LLMResultCache)
+                        .where(LLMResultCache.key == key)
+                        .values(hit_count=LLMResultCache.hit_count + 1)
+                    )
+            if row is not None:
+                result = json.loads(row.result)
+                _memory.set(key, (result, row.latency_ms))
+                _record('db_hits', row.latency_ms)
+                return dict(result)
+        except SQLAlchemyError as e:
+            logger.warning("LLM cache lookup failed: %s", e)
+
+    _record('misses')
+    return None
+
+
+def put(key, result, latency_ms, model_version, prompt_version):
+    """Stores a successful result in both tiers. Callers must not pass error outputs."""
+    if not LLM_CACHE_ENABLED:
+        return
+    _memory.set(key, (dict(result), latency_ms))
+    _record('stores')
+    if not has_app_context():
+        return
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(db.insert(LLMResultCache).values(
+                key=key,
+                result=json.dumps(result, ensure_ascii=False),
+                model_version=model_version,
+                prompt_version=prompt_version,
+                latency_ms=latency_ms,
+                hit_count=0,
+                created_at=utcnow()
+            ))
+    except IntegrityError:
+        pass  # Another worker stored the same key first
+    except SQLAlchemyError as e:
+        # The in-memory tier still has it
+        logger.warning("LLM cache store failed: %s", e)
+
+
+def cache_stats():
+    """Per-process hit/miss counters and the LLM latency those hits avoided."""
+    with _stats_lock:
+        stats = dict(_stats)
+    hits = stats['memory_hits'] + stats['db_hits']
+    lookups = hits + stats['misses']
+    stats['hit_ratio'] = (hits / lookups) if lookups else 0.0
+    stats['memory_size'] = len(_memory)
+    return stats
+
+
+def clear_memory():
+    _memory.clear()
+
+
+llm_cache_cli = AppGroup('llm-cache', help='Inspect the persistent LLM result cache.')
+
+
+@llm_cache_cli.command('stats')
+def stats_command():
+    """Show entries, hits and LLM latency saved across all processes."""
+    entries, hits, saved_ms = db.session.execute(
+        db.select(
+            func.count(LLMResultCache.key),
+            func.coalesce(func.sum(LLMResultCache.hit_count), 0),
+            func.coalesce(func.sum(LLMResultCache.hit_count * LLMResultCache.latency_ms), 0)
+        )
+    ).one()
+    click.echo(f"entries={entries} hits={hits} saved_latency_s={saved_ms / 1000:.1f}")
+
+
+@llm_cache_cli.command('purge')
+@click.option('--prompt-version', default=None, help='Only delete entries produced by this prompt version.')
+def purge_command(prompt_version):
+    """Delete persistent cache entries."""
+    query = db.delete(LLMResultCache)
+    if prompt_version:
+        query = query.where(LLMResultCache.prompt_version == prompt_version)
+    deleted = db.session.execute(query).rowcount
+    db.session.commit()
+    click.echo(f"Deleted {deleted} cache entries")
@@ -0,0 +1,490 @@
+"""
+LLM provider abstraction used by app/utils/llm_handler.py.
+
+Each provider turns (system prompt, user message) into raw response text. LLMEngine
+puts failover, per-provider timeouts, circuit breaking and optional hedging on top:
+providers are tried in order, a provider with too many recent errors is skipped
+until its breaker resets, and when hedging is on a second provider is started once
+the first has been running longer than the hedge threshold. The first valid result wins.
+"""
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from app.utils.metrics import record_llm_call
+
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+# Failover order after the requested provider
+LLM_PROVIDERS = [p.strip() for p in os.getenv("LLM_PROVIDERS", "anthropic,openai,gemini").split(",") if p.strip()]
+# Unset: no hedging. A number: hedge after that many ms. "auto": hedge after the primary's observed p95
+LLM_HEDGE_AFTER_MS = os.getenv("LLM_HEDGE_AFTER_MS", "")
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+# The three-field JSON answer is usually well under 300 tokens
+LLM_MAX_OUTPUT_TOKENS = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", "400"))
+LLM_ENGINE_THREADS = int(os.getenv("LLM_ENGINE_THREADS", "16"))
+
+
+class LLMProviderError(Exception):
+    """Raised when no provider produced a valid result."""
+
+
+class LLMUnavailableError(LLMProviderError):
+    """Raised when no provider is configured (missing API keys) or all breakers are open."""
+
+
+def _provider_timeout(name):
+    return float(os.getenv(f"LLM_TIMEOUT_{name.upper()}", LLM_TIMEOUT_SECONDS))
+
+
+class BaseProvider:
+    name = None
+    api_key_env = None
+    default_model = None
+
+    def __init__(self, model_version=None, timeout=None):
+        self.model_version = model_version or self.default_model
+        self.timeout = timeout if timeout is not None else _provider_timeout(self.name)
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    def available(self):
+        return bool(os.getenv(self.api_key_env)) if self.api_key_env else True
+
+    @property
+    def client(self):
+        # Built on first use and shared by every thread in this process. _make_client imports
+        # the provider SDK there too: they are slow to import and most processes never call them.
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._make_client(os.getenv(self.api_key_env))
+        return self._client
+
+    def _make_client(self, api_key):
+        raise NotImplementedError
+
+    def complete(self, system_prompt, user_message, model_version=None):
+        """
+        Returns (raw response text, token usage dict or None). Usage has 'input'/'output'
+        counts and, where the provider reports them, 'cache_read'/'cache_write' prompt tokens.
+        Raises on API errors and timeouts.
+        """
+        raise NotImplementedError
+
+    def stream(self, system_prompt, user_message, model_version=None, usage=None):
+        """
+        Yields the response text in chunks as it is generated and fills `usage` (a dict)
+        once done. Providers without a streaming implementation yield one chunk.
+        """
+        text, call_usage = self.complete(system_prompt, user_message, model_version)
+        if usage is not None and call_usage:
+            usage.update(call_usage)
+        yield text
+
+
+class AnthropicProvider(BaseProvider):
+    name = "anthropic"
+    api_key_env = "CLAUDE_API_KEY"
+    default_model = os.getenv("MODEL_VERSION", "claude-3-haiku-20240307")
+
+    def _make_client(self, api_key):
+        import anthropic
+        return anthropic.Anthropic(api_key=api_key, timeout=self.timeout, max_retries=0)
+
+    def complete(self, system_prompt, user_message, model_version=None):
+        message = self.client.messages.create(
+            model=model_version or self.model_version,
+            max_tokens=LLM_MAX_OUTPUT_TOKENS,
+            system=system_prompt,
+            messages=[{"role": "user", "content": user_message}]
+        )
+        usage = {
+            "input": message.usage.input_tokens,
+            "output": message.usage.output_tokens,
+            "cache_read": getattr(message.usage, "cache_read_input_tokens", None) or 0,
+            "cache_write": getattr(message.usage, "cache_creation_input_tokens", None) or 0,
+        }
+        return message.content[0].text, usage
+
+    def stream(self, system_prompt, user_message, model_version=None, usage=None):
+        with self.client.messages.stream(
+            model=model_version or self.model_version,
+            max_tokens=LLM_MAX_OUTPUT_TOKENS,
+            system=system_prompt,
+            messages=[{"role": "user", "content": user_message}]
+        ) as stream:
+            for text in stream.text_stream:
+                yield text
+            message = stream.get_final_message()
+        if usage is not None:
+            usage.update({
+                "input": message.usage.input_tokens,
+                "output": message.usage.output_tokens,
+                "cache_read": getattr(message.usage, "cache_read_input_tokens", None) or 0,
+                "cache_write": getattr(message.usage, "cache_creation_input_tokens", None) or 0,
+            })
+
+
+class OpenAIProvider(BaseProvider):
+    name = "openai"
+    api_key_env = "OPENAI_API_KEY"
+    default_model = os.getenv("OPENAI_MODEL_VERSION", "gpt-4o-mini")
+
+    def _make_client(self, api_key):
+        from openai import OpenAI
+        return OpenAI(api_key=api_key, timeout=self.timeout, max_retries=0)
+
+    def complete(self, system_prompt, user_message, model_version=None):
+        response = self.client.chat.completions.create(
+            model=model_version or self.model_version,
+            max_tokens=LLM_MAX_OUTPUT_TOKENS,
+            response_format={"type": "json_object"},
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_message}
+            ]
+        )
+        usage = None
+        if response.usage is not None:
+            # OpenAI caches long prompt prefixes automatically and reports the reused part
+            details = getattr(response.usage, "prompt_tokens_details", None)
+            usage = {
+                "input": response.usage.prompt_tokens,
+                "output": response.usage.completion_tokens,
+                "cache_read": getattr(details, "cached_tokens", None) or 0,
+            }
+        return response.choices[0].message.content, usage
+
+
+class GeminiProvider(BaseProvider):
+    name = "gemini"
+    api_key_env = "GEMINI_API_KEY"
+    default_model = os.getenv("GEMINI_MODEL_VERSION", "gemini-1.5-flash")
+
+    def _make_client(self, api_key):
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        return genai
+
+    def complete(self, system_prompt, user_message, model_version=None):
+        model = self.client.GenerativeModel(model_version or self.model_version, system_instruction=system_prompt)
+        response = model.generate_content(
+            user_message,
+            generation_config={"response_mime_type": "application/json", "max_output_tokens": LLM_MAX_OUTPUT_TOKENS},
+            request_options={"timeout": self.timeout}
+        )
+        metadata = getattr(response, "usage_metadata", None)
+        usage = None
+        if metadata is not None:
+            usage = {
+                "input": metadata.prompt_token_count,
+                "output": metadata.candidates_token_count,
+                "cache_read": getattr(metadata, "cached_content_token_count", None) or 0,
+            }
+        return response.text, usage
+
+
+class FakeProvider(BaseProvider):
+    """
+    Offline stand-in with configurable latency and error rate, used with MODEL_TYPE=fake
+    and for exercising failover/hedging without network access.
+    """
+    name = "fake"
+    default_model = "fake"
+
+    def __init__(self, name=None, latency_ms=None, error_rate=None, response_text=None, **kwargs):
+        super().__init__(**kwargs)
+        if name:
+            self.name = name
+        self.latency_ms = latency_ms if latency_ms is not None else int(os.getenv("FAKE_LLM_LATENCY_MS", "0"))
+        self.error_rate = error_rate if error_rate is not None else float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+        self.response_text = response_text
+        self.calls = 0
+
+    def _response(self, user_message):
+        if self.response_text is not None:
+            return self.response_text
+        match = re.search(r"Isi Feedback: (.*)", user_message, re.S)
+        feedback_text = match.group(1).strip() if match else user_message
+        return json.dumps({
+            "sentiment": "Netral Aja",
+            "summary": f"Ringkasan: {feedback_text[:200]}",
+            "constructiveCriticism": "Coba pertimbangkan masukan ini pelan-pelan ya."
+        }, ensure_ascii=False)
+
+    def _maybe_fail(self):
+        if self.error_rate and random.random() < self.error_rate:
+            raise LLMProviderError(f"{self.name}: simulated provider error")
+
+    def complete(self, system_prompt, user_message, model_version=None):
+        self.calls += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        self._maybe_fail()
+        return self._response(user_message), None
+
+    def stream(self, system_prompt, user_message, model_version=None, usage=None, chunk_size=16):
+        # Same total latency as complete(), spread over the chunks like a real token stream
+        self.calls += 1
+        self._maybe_fail()
+        text = self._response(user_message)
+        chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)] or [""]
+        for chunk in chunks:
+            if self.latency_ms:
+                time.sleep(self.latency_ms / 1000.0 / len(chunks))
+            yield chunk
+
+
+PROVIDER_CLASSES = {
+    "anthropic": AnthropicProvider,
+    "openai": OpenAIProvider,
+    "gemini": GeminiProvider,
+    "fake": FakeProvider,
+}
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures; lets one probe through after `reset_seconds`."""
+
+    def __init__(self, failure_threshold=LLM_BREAKER_FAILURES, reset_seconds=LLM_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def admits(self):
+        """Whether allow() could let a call through, without claiming the half-open probe."""
+        with self._lock:
+            state = self.state
+            return state == "closed" or (state == "half-open" and not self._probing)
+
+    def release(self):
+        """Gives back a probe that allow() granted but that ended without a result (e.g. cancelled)."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class LatencyWindow:
+    """Rolling window of successful call latencies (ms) for one provider."""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, latency_ms):
+        with self._lock:
+            self._samples.append(latency_ms)
+
+    def percentile(self, pct, min_samples=20):
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < min_samples:
+            return None
+        return samples[min(int(len(samples) * pct / 100), len(samples) - 1)]
+
+
+class LLMEngine:
+    def __init__(self, providers=None, order=None, hedge_after_ms=LLM_HEDGE_AFTER_MS, max_workers=LLM_ENGINE_THREADS):
+        self.providers = {}
+        self.breakers = {}
+        self.latencies = {}
+        self.order = list(order if order is not None else LLM_PROVIDERS)
+        self.hedge_after_ms = hedge_after_ms
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        for provider in (providers or []):
+            self.register(provider)
+
+    def register(self, provider):
+        """Adds or replaces a provider, e.g. a FakeProvider in tests."""
+        self.providers[provider.name] = provider
+        self.breakers[provider.name] = CircuitBreaker()
+        self.latencies[provider.name] = LatencyWindow()
+
+    def get(self, name):
+        if name not in self.providers:
+            if name not in PROVIDER_CLASSES:
+                raise ValueError(f"Unsupported LLM provider: {name}. Supported providers are {', '.join(PROVIDER_CLASSES)}.")
+            self.register(PROVIDER_CLASSES[name]())
+        return self.providers[name]
+
+    def _candidates(self, primary):
+        # Breakers are only checked here; the probe of a half-open one is claimed by
+        # allow() when the provider is actually called, so fallbacks never used keep theirs
+        names = [primary] + [n for n in self.order if n != primary]
+        candidates = []
+        for name in names:
+            provider = self.get(name)
+            if provider.available() and self.breakers[name].admits():
+                candidates.append(provider)
+        return candidates
+
+    def _unavailable(self, primary):
+        return LLMUnavailableError(
+            f"No LLM provider available (tried {primary} and failover {self.order}); check API keys and provider health."
+        )
+
+    def _hedge_delay(self, primary):
+        if not self.hedge_after_ms:
+            return None
+        if self.hedge_after_ms == "auto":
+            p95 = self.latencies[primary].percentile(95)
+            return p95 / 1000.0 if p95 is not None else None
+        return float(self.hedge_after_ms) / 1000.0
+
+    def _call(self, provider, system_prompt, user_message, parse, model_version):
+        start = time.perf_counter()
+        try:
+            text, usage = provider.complete(system_prompt, user_message, model_version)
+        except Exception:
+            self.breakers[provider.name].record_failure()
+            record_llm_call(provider.name, time.perf_counter() - start, "error")
+            raise
+        elapsed = time.perf_counter() - start
+        self.breakers[provider.name].record_success()
+        self.latencies[provider.name].add(elapsed * 1000)
+        try:
+            result = parse(text)
+        except ValueError:
+            # Invalid JSON is a bad answer, not an unhealthy provider: failover but keep the breaker closed
+            record_llm_call(provider.name, elapsed, "invalid_json", usage)
+            raise
+        record_llm_call(provider.name, elapsed, "ok", usage)
+        return result
+
+    def stream(self, system_prompt, user_message, primary, model_version=None):
+        """
+        Yields (provider_name, model_version, text_chunk) as the response is generated. Falls over to the
+        next provider only while nothing has been yielded yet; once text has gone out, an
+        error is raised to the caller. No hedging. The caller parses the joined text.
+        """
+        candidates = self._candidates(primary)
+        errors = []
+        for provider in candidates:
+            if not self.breakers[provider.name].allow():
+                continue
+            version = model_version if provider.name == primary else None
+            usage = {}
+            started = False
+            start = time.perf_counter()
+            try:
+                for chunk in provider.stream(system_prompt, user_message, version, usage=usage):
+                    started = True
+                    yield provider.name, version or provider.model_version, chunk
+            except GeneratorExit:
+                # Consumer went away (client disconnected); not the provider's fault
+                record_llm_call(provider.name, time.perf_counter() - start, "cancelled", usage)
+                self.breakers[provider.name].release()
+                raise
+            except Exception as e:
+                self.breakers[provider.name].record_failure()
+                record_llm_call(provider.name, time.perf_counter() - start, "error")
+                if started:
+                    raise LLMProviderError(f"{provider.name}: stream interrupted: {e}") from e
+                errors.append(f"{provider.name}: {e}")
+                continue
+            elapsed = time.perf_counter() - start
+            self.breakers[provider.name].record_success()
+            self.latencies[provider.name].add(elapsed * 1000)
+            record_llm_call(provider.name, elapsed, "ok", usage)
+            return
+        if not errors:
+            raise self._unavailable(primary)
+        raise LLMProviderError("; ".join(errors))
+
+    def complete(self, system_prompt, user_message, parse, primary, model_version=None):
+        """
+        Returns (provider_name, model_version, parsed_result) from the first provider whose
+        response `parse` accepts, naming the model that actually answered (after failover or
+        hedging it is the fallback's own). `model_version` only applies to the primary provider.
+        """
+        hedge_delay = self._hedge_delay(primary)
+        remaining = iter(self._candidates(primary))
+        pending = {}
+        errors = []
+
+        def launch():
+            # Next candidate whose breaker lets a call through right now
+            for provider in remaining:
+                if not self.breakers[provider.name].allow():
+                    continue
+                version = model_version if provider.name == primary else None
+                future = self._executor.submit(self._call, provider, system_prompt, user_message, parse, version)
+                pending[future] = (provider, version or provider.model_version)
+                return True
+            return False
+
+        if not launch():
+            raise self._unavailable(primary)
+        exhausted = False
+        while pending:
+            timeout = hedge_delay if hedge_delay is not None and not exhausted else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # Hedge: the in-flight call is slower than the threshold, race the next provider
+                exhausted = not launch()
+                continue
+            for future in done:
+                provider, version = pending.pop(future)
+                try:
+                    return provider.name, version, future.result()
+                except Exception as e:
+                    errors.append(f"{provider.name}: {e}")
+            if not pending:
+                exhausted = not launch()
+        raise LLMProviderError("; ".join(errors) or "All LLM providers failed")
+
+    def health(self):
+        return {name: self.breakers[name].state for name in self.providers}
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Process-wide engine; breaker state and latency windows are shared by all callers."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = LLMEngine()
+    return _engine
@@ -0,0 +1,249 @@
+"""
+In-process request, SQL and LLM instrumentation exposed in the Prometheus text format.
+
+init_metrics(app) adds per-endpoint latency histograms, per-request SQL query
+counts/time (from SQLAlchemy engine events) and a /metrics scrape endpoint.
+Other modules record into the module-level metrics below (e.g. LLM latency and
+token usage in llm_providers.py). Values are per process; with several server
+workers each one is scraped separately.
+"""
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# Requests slower than this are logged with their SQL stats; 0 disables the log
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def collect(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def collect(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Gauge(_Metric):
+    """Gauge whose samples come from a callback returning {label_values_tuple: value}."""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def collect(self):
+        try:
+            samples = self.callback() if self.callback else {}
+        except Exception as e:
+            logger.warning("Metric callback for %s failed: %s", self.name, e)
+            samples = {}
+        for key, value in samples.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def collect(self):
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames + ("le",), key + (bound,))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_bucket{_format_labels(self.labelnames + ('le',), key + ('+Inf',))} {count}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {count}"
+
+
+REGISTRY = []
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests handled", ("method", "endpoint", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "endpoint"))
+HTTP_SQL_QUERIES = Histogram("http_request_sql_queries", "SQL queries issued per HTTP request", ("endpoint",),
+                             buckets=COUNT_BUCKETS)
+HTTP_SQL_TIME = Histogram("http_request_sql_seconds", "Time spent in SQL per HTTP request", ("endpoint",))
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed")
+DB_QUERY_LATENCY = Histogram("db_query_duration_seconds", "SQL statement latency")
+DB_READ_ROUTING = Counter("db_read_routing_total", "Request sessions eligible for a read replica, by where reads went",
+                          ("target",))
+
+LLM_REQUESTS = Counter("llm_requests_total", "LLM provider calls", ("provider", "outcome"))
+LLM_LATENCY = Histogram("llm_request_duration_seconds", "LLM provider call latency", ("provider",),
+                        buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0))
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens used (direction: input, output, cache_read, cache_write)",
+                     ("provider", "direction"))
+LLM_JSON_FAILURES = Counter("llm_json_parse_failures_total", "LLM responses that were not the expected JSON",
+                            ("provider",))
+
+FEEDBACK_FILTERED = Counter("feedback_filtered_total", "Feedback submissions rejected or collapsed before storage",
+                            ("reason",))
+LLM_CALLS_AVOIDED = Counter("llm_calls_avoided_total", "LLM calls skipped by the submission filters", ("reason",))
+DB_WRITES_AVOIDED = Counter("db_writes_avoided_total", "Feedback inserts skipped by the submission filters",
+                            ("reason",))
+
+
+def record_llm_call(provider, seconds, outcome, usage=None):
+    """
+    outcome: ok, error, invalid_json or cancelled (a streaming client went away).
+    usage: {'input': n, 'output': n, 'cache_read': n, 'cache_write': n} token counts;
+    missing or zero directions are skipped.
+    """
+    LLM_REQUESTS.inc(provider=provider, outcome=outcome)
+    LLM_LATENCY.observe(seconds, provider=provider)
+    if outcome == "invalid_json":
+        LLM_JSON_FAILURES.inc(provider=provider)
+    for direction, tokens in (usage or {}).items():
+        if tokens:
+            LLM_TOKENS.inc(tokens, provider=provider, direction=direction)
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    DB_QUERIES.inc()
+    DB_QUERY_LATENCY.observe(elapsed)
+    if has_request_context() and "sql_count" in g:
+        g.sql_count += 1
+        g.sql_time += elapsed
+
+
+def _cache_gauges():
+    from app.utils.identifier import user_cache_stats
+    from app.utils.llm_cache import cache_stats
+    from app.utils.response_cache import response_cache_stats
+
+    def user_cache():
+        stats = user_cache_stats()
+        return {("user", "hits"): stats["hits"], ("user", "misses"): stats["misses"], ("user", "size"): stats["size"]}
+
+    def response_cache():
+        stats = response_cache_stats()
+        return {("response", k): stats[k] for k in ("hits", "misses", "size")}
+
+    def llm_cache():
+        stats = cache_stats()
+        return {("llm", k): stats[k] for k in ("memory_hits", "db_hits", "misses", "memory_size")}
+
+    Gauge("cache_stats", "In-process cache counters", ("cache", "stat"),
+          callback=lambda: {**user_cache(), **llm_cache(), **response_cache()})
+    Gauge("llm_cache_saved_latency_seconds", "LLM latency avoided by cache hits",
+          callback=lambda: {(): cache_stats()["saved_latency_ms"] / 1000.0})
+
+
+def init_metrics(app):
+    """Installs request timing hooks and the /metrics endpoint on the app."""
+    if not METRICS_ENABLED:
+        return
+    if not any(m.name == "cache_stats" for m in REGISTRY):
+        _cache_gauges()
+
+    @app.before_request
+    def _start_timer():
+        g.request_start = time.perf_counter()
+        g.sql_count = 0
+        g.sql_time = 0.0
+
+    @app.after_request
+    def _record_request(response):
+        start = g.get("request_start")
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        endpoint = request.endpoint or "unmatched"
+        HTTP_REQUESTS.inc(method=request.method, endpoint=endpoint, status=response.status_code)
+        HTTP_LATENCY.observe(elapsed, method=request.method, endpoint=endpoint)
+        HTTP_SQL_QUERIES.observe(g.sql_count, endpoint=endpoint)
+        HTTP_SQL_TIME.observe(g.sql_time, endpoint=endpoint)
+        if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+            logger.warning("Slow request %s %s -> %s in %.0fms (%d SQL queries, %.0fms in SQL)",
+                           request.method, request.path, response.status_code, elapsed * 1000,
+                           g.sql_count, g.sql_time * 1000)
+        return response
+
+    def metrics_endpoint():
+        return Response(render(), mimetype="text/plain; version=0.0.4")
+
+    app.add_url_rule("/metrics", "metrics", metrics_endpoint, methods=["GET"])
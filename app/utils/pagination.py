@@ -0,0 +1,48 @@
+import base64
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(created_at, row_id):
+    """Opaque keyset cursor pointing just after the (created_at, id) of the last returned row."""
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Returns (created_at, id) from a cursor made by encode_cursor. Raises ValueError if malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def parse_limit(value):
+    """Page size from the query string, clamped to MAX_PAGE_SIZE. Raises ValueError if invalid."""
+    if value is None or value == '':
+        return DEFAULT_PAGE_SIZE
+    limit = int(value)
+    if limit < 1:
+        raise ValueError("limit must be a positive integer")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def encode_offset_cursor(offset):
+    """Opaque cursor for ranked results, which have no stable keyset to resume from."""
+    return base64.urlsafe_b64encode(f"o|{offset}".encode()).decode().rstrip('=')
+
+
+def decode_offset_cursor(cursor):
+    """Returns the offset from a cursor made by encode_offset_cursor. Raises ValueError if malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        kind, offset = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        if kind != 'o' or int(offset) < 0:
+            raise ValueError(cursor)
+        return int(offset)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
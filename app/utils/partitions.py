@@ -0,0 +1,106 @@
+"""
+Monthly range partitions of the feedback table on Postgres (PARTITION BY RANGE (created_at),
+see Feedback.__table_args__). Other backends keep a plain table and skip all of this.
+
+create_all makes the partitioned parent, a DEFAULT partition for rows outside every
+monthly range, and the months from the current one to PARTITION_MONTHS_AHEAD ahead.
+`flask feedback partitions` adds the months to come; run it at least monthly (cron),
+because rows past the last month land in the default partition, and a month can't be
+added later while the default partition holds rows in its range.
+The archive job (app/utils/archive.py) drops monthly partitions it has emptied.
+`flask db upgrade` leaves a plain feedback table; `flask feedback migrate-storage`
+converts it (app/utils/storage_migration.py).
+"""
+import os
+import re
+from datetime import date
+
+from sqlalchemy import PrimaryKeyConstraint, event, text
+from sqlalchemy.ext.compiler import compiles
+
+from app.model import Feedback
+
+PARTITION_MONTHS_AHEAD = int(os.getenv("FEEDBACK_PARTITION_MONTHS_AHEAD", "3"))
+
+_PARTITION_NAME = re.compile(r"^feedback_p(\d{4})_(\d{2})$")
+
+
+@compiles(PrimaryKeyConstraint, 'postgresql')
+def _partitioned_primary_key(constraint, compiler, **kw):
+    # A partitioned table's primary key must include the partition key. The ORM keeps
+    # `id` alone as the identity; the database key becomes (id, created_at).
+    # Every other table goes through the dialect's own compiler untouched.
+    if constraint.table is not Feedback.__table__:
+        return compiler.visit_primary_key_constraint(constraint, **kw)
+    columns = [column.name for column in constraint.columns]
+    match = re.search(r"\(([^)]*)\)", constraint.table.dialect_options['postgresql'].get('partition_by') or '')
+    for name in (match.group(1).split(',') if match else []):
+        if name.strip() not in columns:
+            columns.append(name.strip())
+    sql = ''
+    if constraint.name is not None:
+        sql += f"CONSTRAINT {compiler.preparer.format_constraint(constraint)} "
+    sql += f"PRIMARY KEY ({', '.join(compiler.preparer.quote(name) for name in columns)})"
+    return sql
+
+
+def _month_start(year, month):
+    year, month = year + (month - 1) // 12, (month - 1) % 12 + 1
+    return date(year, month, 1)
+
+
+def partition_name(month):
+    return f"feedback_p{month.year:04d}_{month.month:02d}"
+
+
+def ensure_partitions(connection, months_ahead=PARTITION_MONTHS_AHEAD, today=None):
+    """Creates the default partition and the monthly ones up to `months_ahead` if missing. Returns names created."""
+    if connection.dialect.name != 'postgresql':
+        return []
+    today = today or date.today()
+    existing = set(connection.scalars(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'feedback'::regclass"
+    )))
+    created = []
+    if 'feedback_default' not in existing:
+        connection.execute(text("CREATE TABLE feedback_default PARTITION OF feedback DEFAULT"))
+        created.append('feedback_default')
+    for offset in range(months_ahead + 1):
+        start = _month_start(today.year, today.month + offset)
+        end = _month_start(start.year, start.month + 1)
+        name = partition_name(start)
+        if name not in existing:
+            connection.execute(text(
+                f"CREATE TABLE {name} PARTITION OF feedback FOR VALUES FROM ('{start}') TO ('{end}')"
+            ))
+            created.append(name)
+    return created
+
+
+def drop_empty_partitions(connection, before):
+    """Drops monthly partitions whose whole range is older than `before` (a date) and that hold no rows."""
+    if connection.dialect.name != 'postgresql':
+        return []
+    names = connection.scalars(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'feedback'::regclass ORDER BY c.relname"
+    )).all()
+    dropped = []
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if not match:
+            continue
+        end = _month_start(int(match.group(1)), int(match.group(2)) + 1)
+        if end > before:
+            continue
+        # Dropping returns the space at once; the deleted rows would otherwise wait for vacuum
+        if connection.scalar(text(f"SELECT NOT EXISTS (SELECT 1 FROM {name})")):
+            connection.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+    return dropped
+
+
+@event.listens_for(Feedback.__table__, 'after_create')
+def _create_partitions(table, connection, **kw):
+    ensure_partitions(connection)
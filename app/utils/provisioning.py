@@ -0,0 +1,185 @@
+"""
+User creation that lets the database's unique constraints detect duplicates.
+
+insert_user() tries the INSERT inside a savepoint and, only when it fails, runs one
+SELECT to tell which column collided (username, email or link_id; link_id
+collisions are retried with a fresh id). provision_users() does the same for
+many rows at once: passwords are hashed on a process pool, rows go in with one
+multi-row INSERT per batch, and a batch that hits a conflict is replayed row by
+row so every entry gets its own created/conflict/invalid result.
+"""
+import csv
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import insert, or_
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+
+from app import db
+from app.model import User
+from app.utils.uuid import generate_unique_link_id
+
+LINK_ID_ATTEMPTS = 5
+BULK_BATCH_SIZE = int(os.getenv("BULK_REGISTER_BATCH_SIZE", "200"))
+BULK_HASH_PROCESSES = int(os.getenv("BULK_HASH_PROCESSES", str(os.cpu_count() or 1)))
+
+# Unique columns in the order a conflict is reported
+UNIQUE_FIELDS = ('username', 'email', 'link_id')
+
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+
+
+def conflicting_field(username=None, email=None, link_id=None):
+    """After an IntegrityError on User: the unique column that already holds one of these values, or None."""
+    values = {'username': username, 'email': email, 'link_id': link_id}
+    conditions = [getattr(User, field) == value for field, value in values.items() if value is not None]
+    if not conditions:
+        return None
+    rows = db.session.execute(db.select(User.username, User.email, User.link_id).where(or_(*conditions))).all()
+    for field in UNIQUE_FIELDS:
+        if any(getattr(row, field) == values[field] for row in rows):
+            return field
+    return None
+
+
+def insert_user(**fields):
+    """
+    Adds a User with a fresh link_id inside a savepoint. Returns (user, None), or (None, field)
+    when `field` ('username' or 'email') is already taken. Other integrity errors propagate.
+    The caller commits.
+    """
+    for _ in range(LINK_ID_ATTEMPTS):
+        user = User(link_id=generate_unique_link_id(), **fields)
+        try:
+            with db.session.begin_nested():
+                db.session.add(user)
+        except IntegrityError:
+            field = conflicting_field(fields.get('username'), fields.get('email'), user.link_id)
+            if field == 'link_id':
+                continue
+            if field is None:
+                raise
+            return None, field
+        return user, None
+    raise RuntimeError(f"No free link_id after {LINK_ID_ATTEMPTS} attempts")
+
+
+def _get_hash_pool():
+    global _hash_pool
+    if _hash_pool is None:
+        with _hash_pool_lock:
+            if _hash_pool is None:
+                # spawn, not fork: request threads may hold locks when the pool starts
+                _hash_pool = ProcessPoolExecutor(max_workers=BULK_HASH_PROCESSES,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+    return _hash_pool
+
+
+def hash_passwords(passwords):
+    """Hashes many passwords in parallel on the process pool, preserving order."""
+    if not passwords:
+        return []
+    chunksize = max(1, len(passwords) // (BULK_HASH_PROCESSES * 4))
+    return list(_get_hash_pool().map(generate_password_hash, passwords, chunksize=chunksize))
+
+
+def _created(index, user_id, username, link_id):
+    return {'row': index, 'status': 'created', 'user_id': user_id, 'username': username, 'link_id': link_id}
+
+
+def _conflict(index, username, field):
+    return {'row': index, 'status': 'conflict', 'username': username, 'field': field}
+
+
+def provision_users(entries, batch_size=BULK_BATCH_SIZE):
+    """
+    Registers many users from dicts with username, email and password. Returns one result
+    per entry, in input order, with status 'created', 'conflict' (and the taken `field`)
+    or 'invalid'. Commits after every batch.
+    """
+    results = [None] * len(entries)
+    valid = []
+    seen = {'username': set(), 'email': set()}
+    for index, entry in enumerate(entries):
+        entry = entry if isinstance(entry, dict) else {}
+        username, email, password = entry.get('username'), entry.get('email'), entry.get('password')
+        if not username or not email or not password:
+            results[index] = {'row': index, 'status': 'invalid',
+                              'message': 'Username, email, and password are required'}
+            continue
+        duplicate = next((f for f in ('username', 'email') if entry[f] in seen[f]), None)
+        if duplicate:
+            # Repeated within this request; the database would reject it anyway
+            results[index] = _conflict(index, username, duplicate)
+            continue
+        seen['username'].add(username)
+        seen['email'].add(email)
+        valid.append(index)
+
+    hashes = hash_passwords([entries[index]['password'] for index in valid])
+
+    for start in range(0, len(valid), batch_size):
+        batch = list(zip(valid[start:start + batch_size], hashes[start:start + batch_size]))
+        params = [
+            {'username': entries[index]['username'], 'email': entries[index]['email'],
+             'password_hash': password_hash, 'link_id': generate_unique_link_id()}
+            for index, password_hash in batch
+        ]
+        try:
+            with db.session.begin_nested():
+                rows = db.session.execute(insert(User).returning(User.id, User.username), params).all()
+            ids = {row.username: row.id for row in rows}
+            for (index, _), values in zip(batch, params):
+                results[index] = _created(index, ids[values['username']], values['username'], values['link_id'])
+        except IntegrityError:
+            # At least one row collides: replay the batch one row per savepoint to find which
+            for (index, password_hash), values in zip(batch, params):
+                user, field = insert_user(username=values['username'], email=values['email'],
+                                          password_hash=password_hash)
+                if user is None:
+                    results[index] = _conflict(index, values['username'], field)
+                else:
+                    results[index] = _created(index, user.id, user.username, user.link_id)
+        db.session.commit()
+    return results
+
+
+def summarize_results(results):
+    counts = {'created': 0, 'conflict': 0, 'invalid': 0}
+    for result in results:
+        counts[result['status']] += 1
+    return counts
+
+
+def _read_entries(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.json'):
+            return json.load(f)
+        return list(csv.DictReader(f))
+
+
+users_cli = AppGroup('users', help='User provisioning.')
+
+
+@users_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=BULK_BATCH_SIZE, show_default=True, help='Rows per INSERT.')
+@click.option('--report', 'report_path', default=None, help='Write the per-row results to this JSON file.')
+def import_command(path, batch_size, report_path):
+    """Register users from a CSV (username,email,password header) or JSON list file."""
+    results = provision_users(_read_entries(path), batch_size=batch_size)
+    counts = summarize_results(results)
+    for result in results:
+        if result['status'] != 'created':
+            click.echo(f"row {result['row']}: {result['status']} {result.get('field') or result.get('message')}")
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    click.echo(f"created={counts['created']} conflict={counts['conflict']} invalid={counts['invalid']}")
@@ -0,0 +1,231 @@
+"""
+Read-replica routing for db.session.
+
+Each URL in DATABASE_REPLICA_URLS becomes a bind (replica_0, replica_1, ...).
+RoutingSession sends a statement to one of them when:
+- the request is a GET/HEAD to a blueprint in REPLICA_BLUEPRINTS,
+- nothing was committed earlier in the request, and the caller is outside its
+  read-your-writes window (REPLICA_READ_YOUR_WRITES_SECONDS after any request of
+  theirs that committed, see below),
+- the statement is a read and the session is not flushing,
+- a replica is healthy.
+Everything else uses the primary, including the enrichment worker and CLI
+commands. One request stays on one replica, so e.g. the feedback list's version
+stamp (ETag) and its rows come from the same copy.
+
+A replica is taken out for REPLICA_RETRY_SECONDS when a query or connection on
+it fails with an OperationalError or a disconnect, or when the probe (at most every
+REPLICA_CHECK_SECONDS) fails or shows more than REPLICA_MAX_LAG_SECONDS of replay
+lag on Postgres. The request that hit the error is not retried; later ones read
+from the remaining replicas or the primary. State is per worker process.
+
+Read-your-writes: a request that commits pins its caller to the primary, keyed on
+the token's user id and on the client address (anonymous submitters), so it works
+for cross-origin clients that send no cookies. The pin is held in process memory;
+the response also carries X-DB-Primary-Until (epoch seconds), and a client that
+sends it back keeps reading from the primary on every worker process until then.
+
+Replicas are never written or migrated by the app. To try it locally with
+SQLite, copy the database file (e.g. instance/default.db to instance/replica.db)
+and set DATABASE_REPLICA_URLS=sqlite:///replica.db; the copy only changes when
+you copy it again, which makes replica lag easy to see.
+"""
+import logging
+import os
+import random
+import threading
+import time
+
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+
+from app.config import engine_options
+from app.utils.cache import TTLCache
+from app.utils.metrics import DB_READ_ROUTING
+
+logger = logging.getLogger(__name__)
+
+REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+READ_YOUR_WRITES_SECONDS = float(os.getenv("REPLICA_READ_YOUR_WRITES_SECONDS", "5"))
+REPLICA_CHECK_SECONDS = float(os.getenv("REPLICA_CHECK_SECONDS", "10"))
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "0"))  # 0 = don't check lag
+
+# Read-only blueprints whose GETs may be served from a replica
+REPLICA_BLUEPRINTS = frozenset({'lookup', 'users'})
+READ_METHODS = ('GET', 'HEAD')
+PIN_HEADER = 'X-DB-Primary-Until'
+PIN_CACHE_SIZE = 100000
+BIND_PREFIX = 'replica_'
+
+# Seconds since the last replayed transaction; 0 when the standby has replayed all it received
+_PG_LAG = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class _Health:
+    def __init__(self):
+        self.down_until = 0.0
+        self.checked_at = 0.0
+        self.error = None
+        self.lag = None
+        self.lock = threading.Lock()
+
+
+_health = {}
+_health_lock = threading.Lock()
+# (kind, id) -> time.time() until which that caller reads from the primary
+_pins = TTLCache(maxsize=PIN_CACHE_SIZE, ttl=max(READ_YOUR_WRITES_SECONDS, 1))
+
+
+def _state(key):
+    with _health_lock:
+        return _health.setdefault(key, _Health())
+
+
+def replica_binds():
+    """SQLALCHEMY_BINDS entries for the configured replicas."""
+    return {f'{BIND_PREFIX}{i}': {'url': url, **engine_options(url)} for i, url in enumerate(REPLICA_URLS)}
+
+
+def _replica_keys(engines):
+    return [key for key in engines if isinstance(key, str) and key.startswith(BIND_PREFIX)]
+
+
+def mark_down(key, reason):
+    state = _state(key)
+    state.down_until = time.monotonic() + REPLICA_RETRY_SECONDS
+    state.error = str(reason).splitlines()[0]
+    logger.warning("Replica %s unavailable for %ss, reading from the primary: %s",
+                   key, REPLICA_RETRY_SECONDS, state.error)
+
+
+def _probe(key, engine, state):
+    try:
+        with engine.connect() as conn:
+            if REPLICA_MAX_LAG_SECONDS and conn.dialect.name == 'postgresql':
+                lag = conn.execute(_PG_LAG).scalar()
+                state.lag = float(lag) if lag is not None else None
+            else:
+                conn.execute(text('SELECT 1'))
+    except SQLAlchemyError as e:
+        mark_down(key, e)
+        return
+    if state.lag is not None and state.lag > REPLICA_MAX_LAG_SECONDS:
+        mark_down(key, f"replication lag {state.lag:.1f}s")
+    else:
+        state.error = None
+
+
+def is_healthy(key, engine):
+    """False while the replica is marked down; probes it when the last check is older than REPLICA_CHECK_SECONDS."""
+    state = _state(key)
+    now = time.monotonic()
+    if now < state.down_until:
+        return False
+    # One thread probes; the others go with the last known state
+    if now - state.checked_at >= REPLICA_CHECK_SECONDS and state.lock.acquire(blocking=False):
+        try:
+            state.checked_at = now
+            _probe(key, engine, state)
+        finally:
+            state.lock.release()
+    return time.monotonic() >= state.down_until
+
+
+def _pin_keys():
+    # The token's user (set by token_required) and the client address
+    keys = [('client', request.remote_addr)]
+    user = g.get('current_user')
+    if user is not None:
+        keys.append(('user', user.id))
+    return keys
+
+
+def _request_may_use_replica():
+    if not has_request_context() or request.method not in READ_METHODS:
+        return False
+    if request.blueprint not in REPLICA_BLUEPRINTS or g.get('db_committed'):
+        return False
+    now = time.time()
+    try:
+        if float(request.headers.get(PIN_HEADER, 0)) > now:
+            return False
+    except ValueError:
+        pass
+    return all(_pins.get(key, 0) <= now for key in _pin_keys())
+
+
+class RoutingSession(Session):
+    """db.session class that sends eligible reads to a replica (see the module docstring)."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and REPLICA_URLS and not self._flushing and not getattr(clause, 'is_dml', False):
+            replica = self._replica_engine()
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _replica_engine(self):
+        if not _request_may_use_replica():
+            return None
+        engines = self._db.engines
+        # Stick to one replica per session; False means every replica was down when we chose
+        key = self.info.get('replica')
+        if key is None or (key and not is_healthy(key, engines[key])):
+            healthy = [k for k in _replica_keys(engines) if is_healthy(k, engines[k])]
+            key = random.choice(healthy) if healthy else False
+            self.info['replica'] = key
+            DB_READ_ROUTING.inc(target='replica' if key else 'primary_fallback')
+        return engines[key] if key else None
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _remember_commit(session):
+    if has_request_context():
+        g.db_committed = True
+
+
+def init_replicas(app, db):
+    """Watches replica engines for errors and pins clients that wrote to the primary. Call after db.init_app."""
+    if not REPLICA_URLS:
+        return
+    with app.app_context():
+        engines = db.engines
+        for key in _replica_keys(engines):
+            event.listen(engines[key], 'handle_error', _error_handler(key))
+
+    @app.after_request
+    def _pin_to_primary(response):
+        if g.get('db_committed'):
+            # The replica may not have this write yet: read it back from the primary for a while
+            until = time.time() + READ_YOUR_WRITES_SECONDS
+            for key in _pin_keys():
+                _pins.set(key, until)
+            response.headers[PIN_HEADER] = f"{until:.3f}"
+        return response
+
+
+def _error_handler(key):
+    def handle_error(context):
+        if context.is_disconnect or isinstance(context.sqlalchemy_exception, OperationalError):
+            mark_down(key, context.original_exception)
+    return handle_error
+
+
+def replica_status(db):
+    """Health of each replica bind, for /readyz."""
+    status = []
+    for key in _replica_keys(db.engines):
+        state = _state(key)
+        status.append({
+            'bind': key,
+            'healthy': time.monotonic() >= state.down_until,
+            'error': state.error,
+            'lag_seconds': state.lag,
+        })
+    return status
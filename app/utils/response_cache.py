@@ -0,0 +1,63 @@
+"""
+Conditional GET and a serialized-response cache for per-user lists.
+
+ETags are built from the user's feedback version stamp (UserFeedbackStats.version,
+bumped by app/utils/stats.py on every change to their feedback) plus the request
+parameters that select the page. A poll whose If-None-Match still matches gets a 304
+after one primary-key read and no read of the feedback rows. There is no
+Last-Modified / If-Modified-Since: HTTP dates have second precision, so they either
+miss changes made later in the same second or never match; the ETag is exact.
+Bodies are cached per (user, version, page) in process memory; a new version
+makes the old entries unreachable and the TTL lets them age out.
+"""
+import hashlib
+import os
+
+from flask import Response, request
+
+from app.utils.cache import TTLCache
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "5000"))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "300"))
+
+_responses = TTLCache(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+
+
+def make_etag(user_id, version, *params):
+    """Opaque ETag value for one page of one user's data at a given version."""
+    page = hashlib.sha1(repr(params).encode('utf-8')).hexdigest()[:12]
+    return f"{user_id}-{version}-{page}"
+
+
+def not_modified(etag):
+    """True if the request's If-None-Match shows the client already has this version."""
+    return bool(request.if_none_match) and request.if_none_match.contains(etag)
+
+
+def with_validators(response, etag):
+    response.set_etag(etag)
+    # Clients may keep the body but must revalidate before reusing it
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def not_modified_response(etag):
+    return with_validators(Response(status=304), etag)
+
+
+def get(key):
+    """Cached (body, headers) for the key, or None."""
+    return _responses.get(key)
+
+
+def put(key, body, headers):
+    _responses.set(key, (body, headers))
+
+
+def cached_response(body, headers, etag):
+    response = Response(body, mimetype='application/json', headers=headers)
+    return with_validators(response, etag)
+
+
+def response_cache_stats():
+    return _responses.stats()
@@ -0,0 +1,210 @@
+"""
+Full-text search over a user's feedback: the raw feedback_text (feedback_content)
+plus the summary and constructive_criticism (feedback).
+
+Postgres: GIN indexes on the to_tsvector() of each table's part. Expression indexes
+can't span two tables, so the indexes only narrow the candidates (rows where any word
+matches either part); the full query then runs on both parts concatenated, the same
+as SQLite, and so does ranking. The database keeps the indexes current on every
+write, including bulk UPDATEs from the enrichment backfill.
+
+SQLite: a contentless FTS5 table with one row per feedback, kept in sync by triggers
+on both tables. Each row also indexes an `owner` token (u<user_id>), so a user's search
+intersects with their own postings instead of filtering every match afterwards.
+
+Both are created by create_all (after_create). On databases that predate them,
+`flask search rebuild` creates and fills them. Archived feedback is not searchable.
+"""
+import re
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import DDL, event, text
+
+from app import db
+from app.model import Feedback, FeedbackContent
+
+# Text search configuration for Postgres. 'simple' does no stemming, which suits the
+# mix of Indonesian and English. Changing it means recreating the indexes.
+TS_CONFIG = 'simple'
+MAX_QUERY_LENGTH = 200
+# Deep pages of ranked results get expensive; nobody pages this far
+MAX_OFFSET = 1000
+
+
+def _pg_feedback_document(table=''):
+    prefix = f'{table}.' if table else ''
+    return (f"to_tsvector('{TS_CONFIG}'::regconfig, coalesce({prefix}summary, '') || ' ' || "
+            f"coalesce({prefix}constructive_criticism, ''))")
+
+
+def _pg_content_document(table=''):
+    prefix = f'{table}.' if table else ''
+    return f"to_tsvector('{TS_CONFIG}'::regconfig, {prefix}feedback_text)"
+
+
+PG_FEEDBACK_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_feedback_search ON feedback USING GIN ({_pg_feedback_document()})",
+]
+PG_CONTENT_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_feedback_content_search ON feedback_content "
+    f"USING GIN ({_pg_content_document()})",
+]
+
+_FTS_COLUMNS = "owner, feedback_text, summary, constructive_criticism"
+_FTS_TEXT_COLUMNS = "feedback_text summary constructive_criticism"
+
+
+def _fts_values(feedback, content):
+    """rowid and FTS column values from a feedback row and its content row (aliases or 'new'/'old')."""
+    return (f"{feedback}.id, 'u' || {feedback}.user_id, {content}.feedback_text, coalesce({feedback}.summary, ''), "
+            f"coalesce({feedback}.constructive_criticism, '')")
+
+
+def _fts_insert(feedback, content, source):
+    return f"INSERT INTO feedback_fts(rowid, {_FTS_COLUMNS}) SELECT {_fts_values(feedback, content)} {source};"
+
+
+def _fts_delete(feedback, content, source):
+    # Contentless tables need the exact old values to remove a row
+    return (f"INSERT INTO feedback_fts(feedback_fts, rowid, {_FTS_COLUMNS}) "
+            f"SELECT 'delete', {_fts_values(feedback, content)} {source};")
+
+
+# A row is indexed once both halves exist. Whichever half is deleted first removes it;
+# the other trigger then finds no partner row and does nothing.
+SQLITE_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS feedback_fts USING fts5({_FTS_COLUMNS}, content='', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    # Triggers of the single-table layout, replaced by the ones below
+    "DROP TRIGGER IF EXISTS feedback_fts_insert",
+    "DROP TRIGGER IF EXISTS feedback_fts_update",
+    "DROP TRIGGER IF EXISTS feedback_fts_delete",
+    f"""CREATE TRIGGER IF NOT EXISTS feedback_content_fts_insert AFTER INSERT ON feedback_content BEGIN
+        {_fts_insert('f', 'new', 'FROM feedback f WHERE f.id = new.feedback_id')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS feedback_content_fts_update AFTER UPDATE OF feedback_text ON feedback_content BEGIN
+        {_fts_delete('f', 'old', 'FROM feedback f WHERE f.id = old.feedback_id')}
+        {_fts_insert('f', 'new', 'FROM feedback f WHERE f.id = new.feedback_id')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS feedback_content_fts_delete AFTER DELETE ON feedback_content BEGIN
+        {_fts_delete('f', 'old', 'FROM feedback f WHERE f.id = old.feedback_id')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS feedback_fts_update_summary
+        AFTER UPDATE OF user_id, summary, constructive_criticism ON feedback BEGIN
+        {_fts_delete('old', 'c', 'FROM feedback_content c WHERE c.feedback_id = old.id')}
+        {_fts_insert('new', 'c', 'FROM feedback_content c WHERE c.feedback_id = new.id')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS feedback_fts_delete_row AFTER DELETE ON feedback BEGIN
+        {_fts_delete('old', 'c', 'FROM feedback_content c WHERE c.feedback_id = old.id')}
+    END""",
+]
+
+for _statement in PG_FEEDBACK_DDL:
+    event.listen(Feedback.__table__, 'after_create', DDL(_statement).execute_if(dialect='postgresql'))
+for _statement in PG_CONTENT_DDL:
+    event.listen(FeedbackContent.__table__, 'after_create', DDL(_statement).execute_if(dialect='postgresql'))
+# The triggers reference both tables, which have no foreign key between them to order
+# their creation, so they are created once create_all has made every table
+for _statement in SQLITE_DDL:
+    event.listen(db.metadata, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+
+_COLUMNS = "f.id, f.created_at, f.user_id, f.sentiment, f.constructive_criticism, f.summary, f.enrichment_status"
+
+# Each candidate branch uses one table's GIN index (same expressions as the indexes) with
+# any of the words; a row matching all of them across both parts has at least one in one
+# part. The full query and the rank then run over both parts concatenated.
+_PG_SEARCH = text(f"""
+    WITH q AS (SELECT to_tsquery('{TS_CONFIG}'::regconfig, :query) AS q,
+                      to_tsquery('{TS_CONFIG}'::regconfig, :any_query) AS any_q),
+    candidates AS (
+        SELECT f.id FROM feedback f, q
+        WHERE f.user_id = :user_id AND {_pg_feedback_document('f')} @@ q.any_q
+        UNION
+        SELECT c.feedback_id FROM feedback_content c JOIN feedback f ON f.id = c.feedback_id, q
+        WHERE f.user_id = :user_id AND {_pg_content_document('c')} @@ q.any_q
+    )
+    SELECT {_COLUMNS}, ts_rank_cd(d.document, q.q) AS rank
+    FROM candidates m JOIN feedback f ON f.id = m.id JOIN feedback_content c ON c.feedback_id = f.id, q,
+         LATERAL (SELECT {_pg_feedback_document('f')} || {_pg_content_document('c')} AS document) d
+    WHERE d.document @@ q.q
+    ORDER BY rank DESC, f.id DESC
+    LIMIT :limit OFFSET :offset
+""")
+
+# bm25 weights per column: owner 0, feedback_text 1, summary and criticism 0.5; lower is better
+_SQLITE_SEARCH = text(f"""
+    SELECT {_COLUMNS}, -bm25(feedback_fts, 0.0, 1.0, 0.5, 0.5) AS rank
+    FROM feedback_fts JOIN feedback f ON f.id = feedback_fts.rowid
+    WHERE feedback_fts MATCH :query
+    ORDER BY rank DESC, f.id DESC
+    LIMIT :limit OFFSET :offset
+""")
+
+
+def _terms(query):
+    # Only word characters reach the query syntax, so user input can't inject operators
+    return re.findall(r"\w+", query)
+
+
+def _fts5_query(user_id, query):
+    """
+    All words must match, each as a prefix (no stemming, so 'presentasi' also finds 'presentasinya'),
+    in the text columns only: unfiltered, 'u' or 'u1' would match the owner token of every row.
+    """
+    terms = _terms(query)
+    if not terms:
+        return None
+    return (f'owner:u{user_id} AND {{{_FTS_TEXT_COLUMNS}}}: ('
+            + ' '.join(f'"{term}"*' for term in terms) + ')')
+
+
+def _tsquery(query, operator='&'):
+    """Postgres equivalent of _fts5_query; operator '|' gives the any-word query."""
+    terms = _terms(query)
+    return f' {operator} '.join(f'{term}:*' for term in terms) if terms else None
+
+
+def search_feedback(user_id, query, limit, offset=0):
+    """Ranked matches for `query` in one user's feedback, best first. Returns row mappings with a `rank`."""
+    dialect = db.session.get_bind().dialect.name
+    params = {'user_id': user_id, 'limit': limit, 'offset': offset}
+    if dialect == 'postgresql':
+        statement, search_query = _PG_SEARCH, _tsquery(query)
+        params['any_query'] = _tsquery(query, '|')
+    elif dialect == 'sqlite':
+        statement, search_query = _SQLITE_SEARCH, _fts5_query(user_id, query)
+    else:
+        raise NotImplementedError(f"Full-text search is not available on {dialect}")
+    if search_query is None:
+        return []
+    return db.session.execute(statement, {**params, 'query': search_query}).mappings().all()
+
+
+def rebuild(connection):
+    """Creates the search indexes if missing and, on SQLite, refills the FTS table from feedback and feedback_content."""
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        for statement in PG_FEEDBACK_DDL + PG_CONTENT_DDL:
+            connection.execute(text(statement))
+    elif dialect == 'sqlite':
+        for statement in SQLITE_DDL:
+            connection.execute(text(statement))
+        connection.execute(text("INSERT INTO feedback_fts(feedback_fts) VALUES ('delete-all')"))
+        connection.execute(text(
+            f"INSERT INTO feedback_fts(rowid, {_FTS_COLUMNS}) SELECT {_fts_values('f', 'c')} "
+            "FROM feedback f JOIN feedback_content c ON c.feedback_id = f.id"
+        ))
+    else:
+        raise NotImplementedError(f"Full-text search is not available on {dialect}")
+
+
+search_cli = AppGroup('search', help='Full-text search index over feedback.')
+
+
+@search_cli.command('rebuild')
+def rebuild_command():
+    """Create the feedback search index if missing and refill it (SQLite)."""
+    with db.engine.begin() as connection:
+        rebuild(connection)
+    click.echo("Search index rebuilt")
@@ -0,0 +1,214 @@
+"""
+Cheap checks that run before a feedback submission is stored or sent to the LLM.
+
+- Token-bucket rate limits per client address and per target user.
+- A near-duplicate index: for each recipient and sender (client address), bottom-k
+  MinHash signatures of the character shingles of the feedback that sender recently
+  sent them. A resubmission whose estimated Jaccard similarity to one of them reaches
+  DEDUP_THRESHOLD is collapsed onto the existing feedback_id instead of creating a
+  row and an LLM job. Different senders are never collapsed together, and texts
+  shorter than DEDUP_MIN_CHARS ("makasih", "mantap") are never deduplicated.
+
+Both keep their state in the database (rate_limit_bucket, feedback_signature), so
+every gunicorn worker enforces the same limits and sees the same recent feedback.
+A bucket costs one short write transaction per check; a missing bucket row is a full
+bucket, so rows idle long enough to have refilled are deleted now and then, as are
+signatures past DEDUP_TTL. Sender addresses are stored only as hashes. Behind a
+reverse proxy, set PROXY_COUNT so request.remote_addr is the real client.
+"""
+import hashlib
+import heapq
+import itertools
+import os
+import re
+import time
+from datetime import timedelta
+
+from sqlalchemy import case, delete, select, update
+
+from app import db
+from app.model import FeedbackSignature, RateLimitBucket, utcnow
+from app.utils.metrics import DB_WRITES_AVOIDED, FEEDBACK_FILTERED, LLM_CALLS_AVOIDED
+from app.utils.stats import dialect_insert
+
+SPAM_FILTER_ENABLED = os.getenv("SPAM_FILTER_ENABLED", "1") == "1"
+# Tokens refilled per minute and bucket size. A class or office behind one NAT address
+# shares the client bucket, and may all be writing to the same person, so both buckets
+# allow a roomful of submissions at once.
+FEEDBACK_CLIENT_RATE = float(os.getenv("FEEDBACK_CLIENT_RATE", "20"))
+FEEDBACK_CLIENT_BURST = float(os.getenv("FEEDBACK_CLIENT_BURST", "30"))
+FEEDBACK_USER_RATE = float(os.getenv("FEEDBACK_USER_RATE", "60"))
+FEEDBACK_USER_BURST = float(os.getenv("FEEDBACK_USER_BURST", "60"))
+
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+DEDUP_RECENT_PER_USER = int(os.getenv("DEDUP_RECENT_PER_USER", "50"))
+DEDUP_TTL = int(os.getenv("DEDUP_TTL", "86400"))
+# Normalized characters below which feedback is too generic to call a duplicate
+DEDUP_MIN_CHARS = int(os.getenv("DEDUP_MIN_CHARS", "40"))
+SIGNATURE_SIZE = 64  # k smallest shingle hashes kept per text
+SHINGLE_SIZE = 5  # characters
+MAX_SHINGLED_CHARS = 4000
+# Stale bucket / signature rows are deleted once every this many writes per process
+PRUNE_EVERY = 1000
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets refilled at `rate_per_minute`, holding at most `burst` tokens (rate_limit_bucket rows)."""
+
+    def __init__(self, rate_per_minute, burst):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self._calls = itertools.count(1)
+
+    def _refilled(self, now):
+        table = RateLimitBucket.__table__
+        tokens = table.c.tokens + (now - table.c.updated_at) * self.rate
+        return case((tokens > self.burst, self.burst), else_=tokens)
+
+    def take(self, key):
+        """Spends one token. Returns (True, 0) or (False, seconds until a token is available)."""
+        table = RateLimitBucket.__table__
+        now = time.time()
+        refilled = self._refilled(now)
+        with db.engine.begin() as connection:
+            connection.execute(dialect_insert(connection)(table).values(key=key, tokens=self.burst, updated_at=now)
+                               .on_conflict_do_nothing(index_elements=['key']))
+            # Postgres re-checks the condition against a concurrent update of the row, so two
+            # workers can't both spend the last token
+            allowed = connection.execute(
+                update(table).where(table.c.key == key, refilled >= 1)
+                .values(tokens=refilled - 1, updated_at=now)
+            ).rowcount > 0
+            tokens = None if allowed else connection.scalar(select(refilled).where(table.c.key == key))
+            if self.rate and next(self._calls) % PRUNE_EVERY == 0:
+                # Idle this long means full again, the same as having no row
+                connection.execute(delete(table).where(table.c.updated_at < now - self.burst / self.rate))
+        if allowed:
+            return True, 0
+        return False, (1 - tokens) / self.rate if self.rate else 60
+
+
+def _normalize(text):
+    return re.sub(r"\W+", " ", (text or "").casefold()).strip()[:MAX_SHINGLED_CHARS]
+
+
+def signature(text):
+    """Bottom-k MinHash signature: the k smallest 64-bit hashes of the text's character shingles."""
+    text = _normalize(text)
+    if len(text) <= SHINGLE_SIZE:
+        shingles = {text}
+    else:
+        shingles = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    hashes = (int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'big') for s in shingles)
+    return frozenset(heapq.nsmallest(SIGNATURE_SIZE, hashes))
+
+
+def similarity(sig_a, sig_b):
+    """Jaccard estimate from two bottom-k signatures: shared share of the k smallest hashes of their union."""
+    if not sig_a or not sig_b:
+        return 0.0
+    union_bottom = heapq.nsmallest(SIGNATURE_SIZE, sig_a | sig_b)
+    shared = sum(1 for h in union_bottom if h in sig_a and h in sig_b)
+    return shared / len(union_bottom)
+
+
+def _pack(sig):
+    return b''.join(h.to_bytes(8, 'big') for h in sorted(sig))
+
+
+def _unpack(packed):
+    return frozenset(int.from_bytes(packed[i:i + 8], 'big') for i in range(0, len(packed), 8))
+
+
+def _client_hash(client_key):
+    return hashlib.sha256(str(client_key).encode('utf-8')).hexdigest()[:32]
+
+
+class DuplicateIndex:
+    """
+    Recent (signature, feedback_id) pairs per (recipient user_id, sender client key), in
+    feedback_signature; the newest `per_user` within `ttl` seconds are compared.
+    """
+
+    def __init__(self, threshold=DEDUP_THRESHOLD, per_user=DEDUP_RECENT_PER_USER, ttl=DEDUP_TTL):
+        self.threshold = threshold
+        self.per_user = per_user
+        self.ttl = ttl
+        self._calls = itertools.count(1)
+
+    def find(self, user_id, client_key, sig):
+        """Returns the feedback_id of a recent near-duplicate from this sender to this user, or None."""
+        rows = db.session.execute(
+            select(FeedbackSignature.signature, FeedbackSignature.feedback_id)
+            .where(FeedbackSignature.user_id == user_id,
+                   FeedbackSignature.client_key == _client_hash(client_key),
+                   FeedbackSignature.created_at >= utcnow() - timedelta(seconds=self.ttl))
+            .order_by(FeedbackSignature.id.desc())
+            .limit(self.per_user)
+        ).all()
+        for packed, feedback_id in rows:
+            if similarity(sig, _unpack(packed)) >= self.threshold:
+                return feedback_id
+        return None
+
+    def add(self, user_id, client_key, sig, feedback):
+        """Adds the signature of a new Feedback to the current session. Caller commits."""
+        db.session.add(FeedbackSignature(user_id=user_id, client_key=_client_hash(client_key),
+                                         signature=_pack(sig), feedback=feedback))
+        if next(self._calls) % PRUNE_EVERY == 0:
+            db.session.execute(delete(FeedbackSignature).where(
+                FeedbackSignature.created_at < utcnow() - timedelta(seconds=self.ttl)))
+
+
+client_limiter = TokenBucketLimiter(FEEDBACK_CLIENT_RATE, FEEDBACK_CLIENT_BURST)
+user_limiter = TokenBucketLimiter(FEEDBACK_USER_RATE, FEEDBACK_USER_BURST)
+duplicates = DuplicateIndex()
+
+
+def _filtered(reason):
+    # Every filtered submission skips one feedback insert and one LLM call
+    FEEDBACK_FILTERED.inc(reason=reason)
+    LLM_CALLS_AVOIDED.inc(reason=reason)
+    DB_WRITES_AVOIDED.inc(reason=reason)
+
+
+def check_client(client_key):
+    """Returns seconds to wait if the client is over its limit, else None."""
+    if not SPAM_FILTER_ENABLED:
+        return None
+    allowed, retry_after = client_limiter.take(f'c:{_client_hash(client_key)}')
+    if allowed:
+        return None
+    _filtered('client_rate_limit')
+    return retry_after
+
+
+def check_user(user_id):
+    """Returns seconds to wait if the target user is receiving too much feedback, else None."""
+    if not SPAM_FILTER_ENABLED:
+        return None
+    allowed, retry_after = user_limiter.take(f'u:{user_id}')
+    if allowed:
+        return None
+    _filtered('user_rate_limit')
+    return retry_after
+
+
+def find_duplicate(user_id, client_key, feedback_text):
+    """
+    Returns (existing feedback_id or None, signature to pass to remember()). Only the same
+    sender's recent feedback to this user counts, and only for texts of DEDUP_MIN_CHARS or more.
+    """
+    if not SPAM_FILTER_ENABLED or len(_normalize(feedback_text)) < DEDUP_MIN_CHARS:
+        return None, None
+    sig = signature(feedback_text)
+    existing = duplicates.find(user_id, client_key, sig)
+    if existing is not None:
+        _filtered('duplicate')
+    return existing, sig
+
+
+def remember(user_id, client_key, sig, feedback):
+    """Adds a new Feedback to the duplicate index, in the session that stores it. Caller commits."""
+    if sig is not None:
+        duplicates.add(user_id, client_key, sig, feedback)
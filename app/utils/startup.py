@@ -0,0 +1,86 @@
+"""
+Cold-start check: how long a fresh interpreter takes to import the app and run create_app().
+
+`flask startup check` starts a new Python process (so nothing is already imported),
+times `from app import create_app; create_app()` and reads `-X importtime` for the
+slowest modules. It exits non-zero when the best of --runs exceeds the budget or
+when a provider SDK was imported during startup, so CI or a deploy script can gate on it.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import click
+from flask.cli import AppGroup
+
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "1000"))
+# Heavy SDKs that must only load on first LLM call (see llm_providers.py)
+LAZY_MODULES = ('anthropic', 'openai', 'google.generativeai')
+
+_CHILD = """
+import json, sys, time
+start = time.perf_counter()
+from app import create_app
+create_app()
+elapsed = time.perf_counter() - start
+print(json.dumps({'ms': elapsed * 1000, 'modules': sorted(sys.modules)}))
+"""
+
+
+def _parse_importtime(stderr):
+    """{module: cumulative microseconds} from `-X importtime` output."""
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        cumulative[parts[2].strip()] = int(parts[1])
+    return cumulative
+
+
+def measure_startup():
+    """Startup of one fresh process: {'ms', 'modules' (imported), 'importtime' ({module: us})}."""
+    env = {**os.environ, 'PYTHONDONTWRITEBYTECODE': '1'}
+    env.setdefault('SECRET_KEY', 'startup-check')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _CHILD],
+        capture_output=True, text=True, env=env, check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    )
+    measured = json.loads(result.stdout.strip().splitlines()[-1])
+    measured['importtime'] = _parse_importtime(result.stderr)
+    return measured
+
+
+startup_cli = AppGroup('startup', help='Cold-start profiling.')
+
+
+@startup_cli.command('check')
+@click.option('--budget-ms', default=STARTUP_BUDGET_MS, show_default=True,
+              help='Fail if importing the app and running create_app() takes longer.')
+@click.option('--runs', default=3, show_default=True, help='Fresh processes to time; the fastest counts.')
+@click.option('--top', default=15, show_default=True, help='Slowest modules to list.')
+def check_command(budget_ms, runs, top):
+    """Time a cold import of the app and fail if it is over budget or loads a provider SDK."""
+    samples = [measure_startup() for _ in range(max(1, runs))]
+    best = min(samples, key=lambda s: s['ms'])
+
+    # Top-level packages only, so a package and its submodules aren't listed twice
+    packages = {name: us for name, us in best['importtime'].items() if '.' not in name}
+    click.echo("slowest imports (cumulative, with -X importtime overhead):")
+    for name, us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]:
+        click.echo(f"  {us / 1000:8.1f} ms  {name}")
+
+    eager = [name for name in LAZY_MODULES if name in best['modules']]
+    click.echo(f"startup: {best['ms']:.0f} ms (best of {len(samples)}), budget {budget_ms:.0f} ms")
+    failed = False
+    if eager:
+        click.echo(f"FAIL: imported at startup, should load on first use: {', '.join(eager)}")
+        failed = True
+    if best['ms'] > budget_ms:
+        click.echo("FAIL: over budget")
+        failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,274 @@
+"""
+Per-user feedback aggregates: totals, unread count, counts per sentiment and per day,
+plus a version stamp that changes whenever any of the user's feedback does.
+
+A before_flush listener turns every Feedback insert, delete and change to
+`sentiment` / `is_read` into counter deltas and applies them as upserts on the
+same connection, so the aggregates commit or roll back together with the rows.
+Bulk UPDATEs skip the ORM events; their callers report the change through
+apply_bulk_updates() / apply_read_changes() (see backfill in app/utils/enrichment.py
+and the batched mark-as-read endpoint).
+Archived feedback (app/utils/archive.py) keeps counting in the totals, sentiments and
+daily volume, but no longer as unread.
+`flask stats rebuild` recomputes everything from the feedback and archive tables to repair drift.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import case, event, func, insert, literal, true, union_all, update
+from sqlalchemy.orm import Session, attributes
+
+from app import db
+from app.model import Feedback, FeedbackArchive, UserFeedbackDaily, UserFeedbackStats, UserSentimentCount, utcnow
+
+
+class _Deltas:
+    def __init__(self):
+        self.stats = defaultdict(lambda: {'total': 0, 'unread': 0, 'version': 0})
+        self.last_feedback_at = {}
+        self.sentiments = defaultdict(int)
+        self.daily = defaultdict(int)
+
+    def touch(self, user_id):
+        # One version bump per user per flush, however many of their rows changed
+        self.stats[user_id]['version'] = 1
+
+    def add_feedback(self, feedback, sign):
+        self.touch(feedback.user_id)
+        counts = self.stats[feedback.user_id]
+        counts['total'] += sign
+        if not feedback.is_read:
+            counts['unread'] += sign
+        if feedback.sentiment:
+            self.sentiments[(feedback.user_id, feedback.sentiment)] += sign
+        self.daily[(feedback.user_id, feedback.created_at.date())] += sign
+        if sign > 0:
+            latest = self.last_feedback_at.get(feedback.user_id)
+            if latest is None or feedback.created_at > latest:
+                self.last_feedback_at[feedback.user_id] = feedback.created_at
+
+    def change_sentiment(self, user_id, old, new):
+        if old == new:
+            return
+        if old:
+            self.sentiments[(user_id, old)] -= 1
+        if new:
+            self.sentiments[(user_id, new)] += 1
+
+    def change_read(self, user_id, old, new):
+        if bool(old) != bool(new):
+            self.stats[user_id]['unread'] += -1 if new else 1
+
+    def apply(self, connection):
+        now = utcnow()
+        for user_id, counts in self.stats.items():
+            if any(counts.values()) or user_id in self.last_feedback_at:
+                _upsert(connection, UserFeedbackStats, {'user_id': user_id}, counts,
+                        latest={'last_feedback_at': self.last_feedback_at.get(user_id), 'updated_at': now})
+        for (user_id, sentiment), count in self.sentiments.items():
+            if count:
+                _upsert(connection, UserSentimentCount, {'user_id': user_id, 'sentiment': sentiment}, {'count': count})
+        for (user_id, day), count in self.daily.items():
+            if count:
+                _upsert(connection, UserFeedbackDaily, {'user_id': user_id, 'day': day}, {'count': count})
+
+
+def dialect_insert(connection):
+    """The backend's insert() construct, the one with on_conflict_do_update / on_conflict_do_nothing."""
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif connection.dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"INSERT ... ON CONFLICT is not available on {connection.dialect.name}")
+    return insert
+
+
+def _upsert(connection, model, keys, increments, latest=None):
+    """Adds `increments` to the row at `keys`, creating it if missing. `latest` columns keep the max value."""
+    table = model.__table__
+    latest = {column: value for column, value in (latest or {}).items() if value is not None}
+    stmt = dialect_insert(connection)(table).values(**keys, **increments, **latest)
+    set_ = {column: table.c[column] + stmt.excluded[column] for column in increments}
+    for column in latest:
+        set_[column] = case(
+            (table.c[column] > stmt.excluded[column], table.c[column]),
+            else_=stmt.excluded[column]
+        )
+    connection.execute(stmt.on_conflict_do_update(index_elements=list(keys), set_=set_))
+
+
+def _old_and_new(feedback, key):
+    history = attributes.get_history(feedback, key)
+    if not history.has_changes():
+        return None
+    old = history.deleted[0] if history.deleted else None
+    new = history.added[0] if history.added else None
+    return old, new
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_feedback_deltas(session, flush_context, instances):
+    deltas = _Deltas()
+    for obj in session.new:
+        if isinstance(obj, Feedback):
+            if obj.created_at is None:
+                # Set here rather than by the column default so the day bucket matches the row
+                obj.created_at = utcnow()
+            deltas.add_feedback(obj, 1)
+    for obj in session.deleted:
+        if isinstance(obj, Feedback):
+            deltas.add_feedback(obj, -1)
+    for obj in session.dirty:
+        if not isinstance(obj, Feedback) or obj in session.deleted or not session.is_modified(obj):
+            continue
+        deltas.touch(obj.user_id)
+        changed = _old_and_new(obj, 'sentiment')
+        if changed:
+            deltas.change_sentiment(obj.user_id, *changed)
+        changed = _old_and_new(obj, 'is_read')
+        if changed:
+            deltas.change_read(obj.user_id, *changed)
+    if deltas.stats or deltas.sentiments or deltas.daily:
+        deltas.apply(session.connection())
+
+
+def apply_bulk_updates(changes):
+    """
+    For bulk UPDATEs of Feedback rows, which bypass the flush listener. `changes` is an
+    iterable of (user_id, old_sentiment, new_sentiment), one per updated row; every user
+    listed gets a new version. Runs in the current session transaction.
+    """
+    deltas = _Deltas()
+    for user_id, old, new in changes:
+        deltas.touch(user_id)
+        deltas.change_sentiment(user_id, old, new)
+    deltas.apply(db.session.connection())
+
+
+def apply_read_changes(user_id, unread_delta):
+    """For bulk is_read UPDATEs: adds `unread_delta` (negative when rows were marked read) and bumps the version."""
+    if unread_delta:
+        deltas = _Deltas()
+        deltas.touch(user_id)
+        deltas.stats[user_id]['unread'] += unread_delta
+        deltas.apply(db.session.connection())
+
+
+def apply_archived(unread_by_user):
+    """
+    For feedback moved to the archive with bulk DELETEs: `unread_by_user` maps every user
+    whose rows moved to how many of them were unread. Totals, sentiments and days stay as
+    they are; unread drops and each user gets a new version.
+    """
+    deltas = _Deltas()
+    for user_id, unread in unread_by_user.items():
+        deltas.touch(user_id)
+        deltas.stats[user_id]['unread'] -= unread
+    deltas.apply(db.session.connection())
+
+
+def feedback_version(user_id):
+    """Version stamp of the user's feedback; 0 before their first feedback. One primary-key read."""
+    version = db.session.scalar(db.select(UserFeedbackStats.version).where(UserFeedbackStats.user_id == user_id))
+    return version or 0
+
+
+def user_stats(user_id, days=30):
+    """Aggregates for one user; reads a fixed number of small rows whatever their feedback volume."""
+    totals = db.session.get(UserFeedbackStats, user_id)
+    sentiments = db.session.execute(
+        db.select(UserSentimentCount.sentiment, UserSentimentCount.count)
+        .where(UserSentimentCount.user_id == user_id, UserSentimentCount.count > 0)
+    ).all()
+    since = utcnow().date() - timedelta(days=days - 1)
+    daily = db.session.execute(
+        db.select(UserFeedbackDaily.day, UserFeedbackDaily.count)
+        .where(UserFeedbackDaily.user_id == user_id, UserFeedbackDaily.day >= since, UserFeedbackDaily.count > 0)
+        .order_by(UserFeedbackDaily.day)
+    ).all()
+    total = totals.total if totals else 0
+    return {
+        'total': total,
+        'unread': totals.unread if totals else 0,
+        'pending': total - sum(row.count for row in sentiments),
+        'sentiments': {row.sentiment: row.count for row in sentiments},
+        'last_feedback_at': totals.last_feedback_at.isoformat() if totals and totals.last_feedback_at else None,
+        'daily': [{'date': row.day.isoformat(), 'count': row.count} for row in daily],
+    }
+
+
+def rebuild(user_id=None):
+    """
+    Recomputes the aggregates (of one user, or everyone) from the feedback and archive tables. Caller commits.
+    Feedback written by other processes while this runs can be missed; run it when traffic is quiet.
+    Versions keep counting up from their old values so cached ETags can't match rebuilt data.
+    """
+    old_versions = db.session.execute(
+        db.select(UserFeedbackStats.user_id, UserFeedbackStats.version)
+        .where(UserFeedbackStats.user_id == user_id if user_id is not None else true())
+    ).all()
+    models = (UserFeedbackStats, UserSentimentCount, UserFeedbackDaily)
+    for model in models:
+        query = db.delete(model)
+        if user_id is not None:
+            query = query.where(model.user_id == user_id)
+        db.session.execute(query)
+
+    def scoped(select, model):
+        return select.where(model.user_id == user_id) if user_id is not None else select
+
+    # Live and archived rows alike; only live ones can be unread
+    rows = union_all(
+        scoped(db.select(Feedback.user_id, Feedback.sentiment, Feedback.created_at,
+                         case((Feedback.is_read.is_(False), 1), else_=0).label('unread')), Feedback),
+        scoped(db.select(FeedbackArchive.user_id, FeedbackArchive.sentiment, FeedbackArchive.created_at,
+                         literal(0).label('unread')), FeedbackArchive),
+    ).subquery()
+
+    db.session.execute(insert(UserFeedbackStats).from_select(
+        ['user_id', 'total', 'unread', 'last_feedback_at'],
+        db.select(rows.c.user_id, func.count(), func.sum(rows.c.unread), func.max(rows.c.created_at))
+        .group_by(rows.c.user_id)
+    ))
+    db.session.execute(insert(UserSentimentCount).from_select(
+        ['user_id', 'sentiment', 'count'],
+        db.select(rows.c.user_id, rows.c.sentiment, func.count())
+        .where(rows.c.sentiment.is_not(None))
+        .group_by(rows.c.user_id, rows.c.sentiment)
+    ))
+    day = func.date(rows.c.created_at)
+    db.session.execute(insert(UserFeedbackDaily).from_select(
+        ['user_id', 'day', 'count'],
+        db.select(rows.c.user_id, day, func.count()).group_by(rows.c.user_id, day)
+    ))
+
+    restored = [{'user_id': row.user_id, 'version': row.version} for row in old_versions]
+    if restored:
+        # Bulk UPDATE by primary key; users who no longer have feedback have no row and are skipped
+        present = set(db.session.scalars(
+            db.select(UserFeedbackStats.user_id).where(UserFeedbackStats.user_id.in_([r['user_id'] for r in restored]))
+        ))
+        restored = [r for r in restored if r['user_id'] in present]
+        if restored:
+            db.session.execute(update(UserFeedbackStats), restored)
+    db.session.execute(
+        update(UserFeedbackStats)
+        .where(UserFeedbackStats.user_id == user_id if user_id is not None else true())
+        .values(version=UserFeedbackStats.version + 1, updated_at=utcnow())
+    )
+
+
+stats_cli = AppGroup('stats', help='Per-user feedback aggregates.')
+
+
+@stats_cli.command('rebuild')
+@click.option('--user-id', type=int, default=None, help='Only rebuild this user (default: everyone).')
+def rebuild_command(user_id):
+    """Recompute the per-user aggregates from the feedback and archive tables."""
+    rebuild(user_id)
+    db.session.commit()
+    rows = db.session.scalar(db.select(func.count()).select_from(UserFeedbackStats))
+    click.echo(f"Rebuilt feedback stats ({rows} users with feedback)")
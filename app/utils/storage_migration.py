@@ -0,0 +1,156 @@
+"""
+Conversion of the plain Postgres feedback table into the range-partitioned one the model
+declares (app/utils/partitions.py). `flask db upgrade` brings the schema up to date but
+leaves feedback a plain table (migrations/versions/0010_feedback_storage.py); other
+backends are never partitioned and have nothing to convert.
+
+`flask feedback migrate-storage --i-have-a-backup` converts it in one transaction:
+  1. takes an ACCESS EXCLUSIVE lock on feedback, waiting at most MIGRATE_STORAGE_LOCK_TIMEOUT
+     for running queries. Every read and write of feedback then blocks until the copy
+     commits, so stop the app and the enrichment worker or schedule a window for it,
+  2. renames the table to feedback_unpartitioned, with its key, indexes and id sequence,
+  3. creates the partitioned feedback, with monthly partitions covering the rows' dates,
+     and copies the rows over keeping their ids.
+feedback_unpartitioned is kept as the way back: `--rollback` makes it feedback again,
+bringing over what changed since, under the same lock. Once the partitioned table has
+proven itself, drop the old one by hand: DROP TABLE feedback_unpartitioned.
+"""
+import os
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.model import Feedback
+from app.utils.partitions import PARTITION_MONTHS_AHEAD, ensure_partitions
+
+MIGRATE_STORAGE_LOCK_TIMEOUT = os.getenv("MIGRATE_STORAGE_LOCK_TIMEOUT", "10s")
+
+# Appended to the old table's name and to those of its constraints, indexes and sequence
+_OLD_SUFFIX = '_unpartitioned'
+OLD_TABLE = 'feedback' + _OLD_SUFFIX
+
+
+class StorageMigrationError(Exception):
+    """The database is not in a state the conversion (or its rollback) can start from."""
+
+
+def _has_table(connection, name):
+    return connection.scalar(text("SELECT to_regclass(:name) IS NOT NULL"), {'name': name})
+
+
+def _is_partitioned(connection):
+    return connection.scalar(text("SELECT relkind = 'p' FROM pg_class WHERE oid = 'feedback'::regclass"))
+
+
+def _months_between(start, end):
+    return (end.year - start.year) * 12 + end.month - start.month
+
+
+def _lock(connection, *tables):
+    # Fail instead of queueing behind a long query: every later query on the table would queue behind us
+    connection.execute(text("SELECT set_config('lock_timeout', :timeout, true)"),
+                       {'timeout': MIGRATE_STORAGE_LOCK_TIMEOUT})
+    try:
+        connection.execute(text(f"LOCK TABLE {', '.join(tables)} IN ACCESS EXCLUSIVE MODE"))
+    except OperationalError as e:
+        raise StorageMigrationError(f"No lock on {', '.join(tables)} within {MIGRATE_STORAGE_LOCK_TIMEOUT}; "
+                                    "stop what is using the table and retry") from e
+
+
+def _rename_table(connection, table, new_table, rename):
+    """Renames a plain table, then its constraints, other indexes and id sequence through `rename`."""
+    connection.execute(text(f"ALTER TABLE {table} RENAME TO {new_table}"))
+    # Renaming a key constraint renames its index too
+    constraints = connection.scalars(text(
+        "SELECT conname FROM pg_constraint WHERE conrelid = CAST(:table AS regclass)"
+    ), {'table': new_table}).all()
+    for name in constraints:
+        connection.execute(text(f'ALTER TABLE {new_table} RENAME CONSTRAINT "{name}" TO "{rename(name)}"'))
+    indexes = connection.scalars(text(
+        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE i.indrelid = CAST(:table AS regclass) AND NOT EXISTS "
+        "(SELECT 1 FROM pg_constraint k WHERE k.conrelid = i.indrelid AND k.conindid = i.indexrelid)"
+    ), {'table': new_table}).all()
+    for name in indexes:
+        connection.execute(text(f'ALTER INDEX "{name}" RENAME TO "{rename(name)}"'))
+    sequence = connection.scalar(text("SELECT pg_get_serial_sequence(:table, 'id')"), {'table': new_table})
+    if sequence:
+        name = sequence.split('.')[-1].strip('"')
+        connection.execute(text(f'ALTER SEQUENCE {sequence} RENAME TO "{rename(name)}"'))
+
+
+def _reset_sequence(connection):
+    connection.execute(text(
+        "SELECT setval(pg_get_serial_sequence('feedback', 'id'), coalesce(max(id), 0) + 1, false) FROM feedback"
+    ))
+
+
+def migrate_storage(connection):
+    """Converts feedback into the partitioned table, keeping the old one. Returns a line per step taken."""
+    if connection.dialect.name != 'postgresql':
+        return [f"Feedback is not partitioned on {connection.dialect.name}; nothing to do"]
+    if _is_partitioned(connection):
+        return ["Feedback is already partitioned; nothing to do"]
+    columns = [column.name for column in Feedback.__table__.columns]
+    present = set(connection.scalars(text(
+        "SELECT column_name FROM information_schema.columns WHERE table_schema = current_schema() "
+        "AND table_name = 'feedback'"
+    )))
+    if 'feedback_text' in present or not set(columns) <= present:
+        raise StorageMigrationError("feedback is not at the current schema; run `flask db upgrade` first")
+    if _has_table(connection, OLD_TABLE):
+        raise StorageMigrationError(f"{OLD_TABLE} is left from an earlier conversion; drop it or roll back first")
+
+    _lock(connection, 'feedback')
+    # A partitioned table has no unique key on id alone for a foreign key to point at
+    references = connection.scalars(text(
+        "SELECT conrelid::regclass::text || '.' || conname FROM pg_constraint "
+        "WHERE confrelid = 'feedback'::regclass AND contype = 'f'"
+    )).all()
+    if references:
+        raise StorageMigrationError(f"Foreign keys still reference feedback: {', '.join(references)}")
+
+    _rename_table(connection, 'feedback', OLD_TABLE, lambda name: name + _OLD_SUFFIX)
+    # after_create adds the default partition, the coming months and the search index
+    Feedback.__table__.create(connection)
+    first = connection.scalar(text(f"SELECT min(created_at) FROM {OLD_TABLE}"))
+    if first is not None:
+        today = date.today()
+        ensure_partitions(connection, _months_between(first, today) + PARTITION_MONTHS_AHEAD, today=first.date())
+    names = ', '.join(columns)
+    copied = connection.execute(text(f"INSERT INTO feedback ({names}) SELECT {names} FROM {OLD_TABLE}")).rowcount
+    _reset_sequence(connection)
+    connection.execute(text("ANALYZE feedback"))
+    return [
+        f"Copied {copied} rows into the partitioned feedback table",
+        f"Kept the old table as {OLD_TABLE}; `flask feedback migrate-storage --i-have-a-backup --rollback` "
+        f"restores it, DROP TABLE {OLD_TABLE} discards it",
+    ]
+
+
+def rollback_storage(connection):
+    """Makes the table kept by migrate_storage feedback again, with the rows as they are now."""
+    if connection.dialect.name != 'postgresql':
+        return [f"Feedback is not partitioned on {connection.dialect.name}; nothing to do"]
+    if not _is_partitioned(connection):
+        return ["Feedback is not partitioned; nothing to do"]
+    if not _has_table(connection, OLD_TABLE):
+        raise StorageMigrationError(f"{OLD_TABLE} is gone; restore the backup instead")
+
+    _lock(connection, 'feedback', OLD_TABLE)
+    columns = [column.name for column in Feedback.__table__.columns]
+    names = ', '.join(columns)
+    removed = connection.execute(text(
+        f"DELETE FROM {OLD_TABLE} o WHERE NOT EXISTS (SELECT 1 FROM feedback f WHERE f.id = o.id)"
+    )).rowcount
+    updates = ', '.join(f"{name} = excluded.{name}" for name in columns if name != 'id')
+    written = connection.execute(text(
+        f"INSERT INTO {OLD_TABLE} ({names}) SELECT {names} FROM feedback "
+        f"ON CONFLICT (id) DO UPDATE SET {updates}"
+    )).rowcount
+    # Takes the partitions and the new table's sequence with it
+    connection.execute(text("DROP TABLE feedback"))
+    _rename_table(connection, OLD_TABLE, 'feedback', lambda name: name.removesuffix(_OLD_SUFFIX))
+    _reset_sequence(connection)
+    return [f"Restored the plain feedback table: {written} rows written back, {removed} removed"]
@@ -0,0 +1,125 @@
+"""
+Deterministic benchmark dataset: users and a skewed number of feedback rows per user.
+
+Feedback counts follow a Zipf-like distribution (weight 1 / rank**skew), so a few
+users own most of the rows, as with real share links. Rows are inserted with
+multi-row Core INSERTs, which skip the ORM listeners. The per-user stats are
+therefore rebuilt once at the end. Search indexes are maintained by the database
+(SQLite triggers, the Postgres expression indexes).
+"""
+import random
+from datetime import timedelta
+
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
+from app import db
+from app.model import Feedback, FeedbackContent, User, utcnow
+from app.utils import stats
+
+BENCH_PASSWORD = 'bench-password'
+SENTIMENTS = ('Positif Banget', 'Agak Positif', 'Netral Aja', 'Agak Negatif', 'Negatif Banget')
+RELATIONS = ('teman sekelas', 'rekan kerja', 'atasan', 'teman organisasi', None)
+WORDS = (
+    'presentasi', 'meeting', 'telat', 'kerja', 'tim', 'komunikasi', 'bagus', 'kurang', 'tolong', 'lebih',
+    'sering', 'jarang', 'ide', 'proyek', 'deadline', 'bantu', 'sabar', 'jelas', 'cepat', 'detail',
+    'slide', 'laporan', 'diskusi', 'feedback', 'semangat', 'capek', 'fokus', 'santai', 'rapi', 'inisiatif',
+)
+INSERT_BATCH = 1000
+
+
+def feedback_counts(users, mean_per_user, skew, rng):
+    """Per-user feedback counts summing to about users * mean_per_user, skewed by rank (shuffled)."""
+    weights = [1 / (rank ** skew) for rank in range(1, users + 1)]
+    scale = users * mean_per_user / sum(weights)
+    counts = [int(round(w * scale)) for w in weights]
+    rng.shuffle(counts)
+    return counts
+
+
+def random_text(rng, min_words=8, max_words=60):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words)))
+
+
+def _flush(rows, texts):
+    if rows:
+        # Content rows reference the generated ids, returned in the order the rows were sent
+        ids = db.session.scalars(insert(Feedback).returning(Feedback.id, sort_by_parameter_order=True), rows).all()
+        db.session.execute(insert(FeedbackContent), [
+            {'feedback_id': feedback_id, 'feedback_text': text}
+            for feedback_id, text in zip(ids, texts)
+        ])
+        rows.clear()
+        texts.clear()
+
+
+def seed(users=200, mean_per_user=20, skew=1.1, days=90, seed_value=42):
+    """
+    Inserts `users` users (bench0000...) and their feedback into the current database.
+    Returns a summary dict. Expects empty tables; caller commits.
+    """
+    rng = random.Random(seed_value)
+    # One hash for everyone: hashing is deliberately slow and not what the seed measures
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+    now = utcnow()
+
+    user_rows = [
+        {'username': f'bench{i:04d}', 'email': f'bench{i:04d}@example.com',
+         'password_hash': password_hash, 'link_id': f'bn{i:06x}'}
+        for i in range(users)
+    ]
+    for start in range(0, len(user_rows), INSERT_BATCH):
+        db.session.execute(insert(User), user_rows[start:start + INSERT_BATCH])
+    ids = dict(db.session.execute(db.select(User.username, User.id)).all())
+
+    counts = feedback_counts(users, mean_per_user, skew, rng)
+    rows, texts = [], []
+    for row, count in zip(user_rows, counts):
+        user_id = ids[row['username']]
+        for _ in range(count):
+            text = random_text(rng)
+            texts.append(text)
+            rows.append({
+                'user_id': user_id,
+                'anon_identifier': rng.choice(RELATIONS),
+                'summary': f'Ringkasan: {text[:120]}',
+                'sentiment': rng.choice(SENTIMENTS),
+                'constructive_criticism': random_text(rng, 5, 20),
+                'is_read': rng.random() < 0.5,
+                'enrichment_status': 'done',
+                'created_at': now - timedelta(seconds=rng.uniform(0, days * 86400)),
+            })
+            if len(rows) >= INSERT_BATCH:
+                _flush(rows, texts)
+    _flush(rows, texts)
+
+    stats.rebuild()
+    return {
+        'users': users,
+        'feedbacks': sum(counts),
+        'max_per_user': max(counts, default=0),
+        'median_per_user': sorted(counts)[len(counts) // 2] if counts else 0,
+        'skew': skew,
+        'seed': seed_value,
+    }
+
+
+def reset_and_seed(users, mean_per_user, skew, seed_value):
+    """Drops and recreates the app's tables, then seeds and commits. Scratch databases only."""
+    db.drop_all()
+    db.create_all()
+    summary = seed(users, mean_per_user, skew, seed_value=seed_value)
+    db.session.commit()
+    return summary
+
+
+def bench_users():
+    """(id, username, email, link_id, password_hash) rows of the seeded users, most feedback first."""
+    counts = dict(db.session.execute(
+        db.select(Feedback.user_id, db.func.count(Feedback.id)).group_by(Feedback.user_id)
+    ).all())
+    users = db.session.execute(
+        db.select(User.id, User.username, User.email, User.link_id, User.password_hash)
+        .where(User.username.like('bench%'))
+    ).all()
+    return sorted(users, key=lambda u: counts.get(u.id, 0), reverse=True)
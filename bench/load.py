@@ -0,0 +1,451 @@
+"""
+Concurrent load test over every blueprint registered by create_app.
+
+Seeds (with --reset) a deterministic dataset, then runs --requests scenario steps
+on --concurrency threads. Each step picks a scenario by weight (--mix) and a
+target user. Popular users are picked more often, and they also own the most
+feedback. Requests go through the Flask test client in this process by default. With --url
+they go over HTTP to a running server, which must use the same DATABASE_URL and
+SECRET_KEY (tokens are minted here) and the same FAKE_LLM_* settings.
+
+The LLM is the offline fake provider (MODEL_TYPE=fake) with --llm-latency-ms and
+--llm-error-rate. --worker runs the enrichment worker alongside, so submissions
+also cost background LLM calls. The spam filter is off unless --spam-filter is given,
+because its rate limits would otherwise reject most of the synthetic traffic.
+
+Prints (or writes to --output) JSON: per endpoint the request count, status counts,
+errors (5xx and exceptions), throughput and p50/p95/p99 latency in milliseconds.
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+DEFAULT_MIX = {
+    'lookup': 25,
+    'feedbacks': 20,
+    'feedbacks_poll': 10,
+    'stats': 8,
+    'search': 8,
+    'mark_read': 4,
+    'submit': 12,
+    'stream': 3,
+    'login': 2,
+    'refresh': 2,
+    'register': 1,
+    'healthz': 2,
+    'readyz': 1,
+    'metrics': 1,
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL', 'sqlite:////tmp/jujurly-bench.db'))
+    parser.add_argument('--reset', action='store_true', help='Drop and recreate the tables, then seed.')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--feedbacks-per-user', type=float, default=20, help='Mean; the distribution is skewed.')
+    parser.add_argument('--skew', type=float, default=1.1, help='Zipf exponent for feedback counts and user traffic.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--requests', type=int, default=5000, help='Scenario steps to run (after warmup).')
+    parser.add_argument('--warmup', type=int, default=200, help='Steps run first and not recorded.')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--mix', default='', help='Weight overrides, e.g. "submit=0,search=20".')
+    parser.add_argument('--llm-latency-ms', type=int, default=200)
+    parser.add_argument('--llm-error-rate', type=float, default=0.0)
+    parser.add_argument('--worker', action='store_true', help='Run the enrichment worker during the test.')
+    parser.add_argument('--spam-filter', action='store_true', help='Keep the feedback spam filter on.')
+    parser.add_argument('--url', default=None, help='Base URL of a running server instead of the in-process app.')
+    parser.add_argument('--output', default=None, help='Write the JSON report here instead of stdout.')
+    return parser.parse_args(argv)
+
+
+def parse_mix(overrides):
+    mix = dict(DEFAULT_MIX)
+    for item in filter(None, (part.strip() for part in overrides.split(','))):
+        name, _, weight = item.partition('=')
+        if name not in mix:
+            raise SystemExit(f"Unknown scenario {name!r}; choose from {', '.join(mix)}")
+        mix[name] = float(weight)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def configure_environment(args):
+    """Settings read at import time by the app; must run before `app` is imported."""
+    os.environ['DATABASE_URL'] = args.database_url
+    os.environ.setdefault('SECRET_KEY', 'bench-secret')
+    os.environ['MODEL_TYPE'] = 'fake'
+    os.environ['LLM_PROVIDERS'] = 'fake'
+    os.environ['FAKE_LLM_LATENCY_MS'] = str(args.llm_latency_ms)
+    os.environ['FAKE_LLM_ERROR_RATE'] = str(args.llm_error_rate)
+    os.environ['SPAM_FILTER_ENABLED'] = '1' if args.spam_filter else '0'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+
+class InProcessClient:
+    def __init__(self, app):
+        self._client = app.test_client()
+
+    def request(self, method, path, body=None, headers=None):
+        response = self._client.open(path, method=method, json=body, headers=headers or {})
+        return response.status_code, response.headers, response.get_data()
+
+
+class HttpClient:
+    """One keep-alive connection per thread."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self._connect = lambda: connection_class(parts.hostname, parts.port, timeout=60)
+        self._prefix = parts.path.rstrip('/')
+        self._connection = self._connect()
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        try:
+            self._connection.request(method, self._prefix + path, body=payload, headers=headers)
+            response = self._connection.getresponse()
+            return response.status, response.headers, response.read()
+        except (http.client.HTTPException, OSError):
+            self._connection.close()
+            self._connection = self._connect()
+            raise
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.exceptions = Counter()
+        self.enabled = False
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, status):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.latencies[name].append(seconds)
+            self.statuses[name][status] += 1
+
+    def record_exception(self, name, exc):
+        if self.enabled:
+            with self._lock:
+                self.exceptions[f'{name}: {type(exc).__name__}'] += 1
+
+
+class Session:
+    """Per-thread state: client, RNG, and what earlier responses told us (ETags, feedback ids)."""
+
+    def __init__(self, client, recorder, users, user_weights, tokens, rng):
+        self.client = client
+        self.recorder = recorder
+        self.users = users
+        self.user_weights = user_weights
+        self.tokens = tokens
+        self.rng = rng
+        self.etags = {}
+        self.feedback_ids = {}
+        self.registered = 0
+
+    def call(self, name, method, path, body=None, headers=None):
+        start = time.perf_counter()
+        try:
+            status, response_headers, data = self.client.request(method, path, body, headers)
+        except Exception as e:
+            self.recorder.record(name, time.perf_counter() - start, 'exception')
+            self.recorder.record_exception(name, e)
+            return None, {}, b''
+        self.recorder.record(name, time.perf_counter() - start, status)
+        return status, response_headers, data
+
+    def pick_user(self):
+        return self.rng.choices(self.users, cum_weights=self.user_weights)[0]
+
+    def identifier(self, user):
+        return self.rng.choice((user.username, user.link_id))
+
+    def auth(self, user):
+        return {'Authorization': f"Bearer {self.tokens[user.id]['access_token']}"}
+
+
+def _json(data):
+    try:
+        return json.loads(data)
+    except ValueError:
+        return None
+
+
+def scenario_lookup(s):
+    user = s.pick_user()
+    s.call('lookup', 'GET', f'/api/user/lookup/{s.rng.choice((user.username, user.link_id, user.email))}')
+
+
+def scenario_feedbacks(s):
+    user = s.pick_user()
+    status, headers, data = s.call('feedbacks', 'GET', f'/api/users/{user.username}/feedbacks?limit=20',
+                                   headers=s.auth(user))
+    if status == 200:
+        s.etags[user.id] = headers.get('ETag')
+        s.feedback_ids[user.id] = [row['id'] for row in _json(data) or []]
+        cursor = headers.get('X-Next-Cursor')
+        if cursor and s.rng.random() < 0.3:
+            s.call('feedbacks_next_page', 'GET', f'/api/users/{user.username}/feedbacks?limit=20&cursor={cursor}',
+                   headers=s.auth(user))
+
+
+def scenario_feedbacks_poll(s):
+    # A client re-fetching its list; mostly answered with 304
+    user = s.pick_user()
+    headers = s.auth(user)
+    if s.etags.get(user.id):
+        headers['If-None-Match'] = s.etags[user.id]
+    status, response_headers, _ = s.call('feedbacks_poll', 'GET', f'/api/users/{user.username}/feedbacks?limit=20',
+                                         headers=headers)
+    if status in (200, 304):
+        s.etags[user.id] = response_headers.get('ETag')
+
+
+def scenario_stats(s):
+    user = s.pick_user()
+    s.call('stats', 'GET', f'/api/users/{user.username}/stats?days=30', headers=s.auth(user))
+
+
+def scenario_search(s):
+    from bench.dataset import WORDS
+    user = s.pick_user()
+    query = ' '.join(s.rng.sample(WORDS, s.rng.choice((1, 1, 2))))
+    s.call('search', 'GET', f'/api/users/{user.username}/search?q={query.replace(" ", "+")}&limit=20',
+           headers=s.auth(user))
+
+
+def scenario_mark_read(s):
+    user = s.pick_user()
+    ids = s.feedback_ids.get(user.id)
+    if not ids:
+        return scenario_feedbacks(s)
+    s.call('mark_read', 'POST', f'/api/users/{user.username}/feedbacks/read',
+           body={'ids': s.rng.sample(ids, min(len(ids), 5)), 'is_read': s.rng.random() < 0.8},
+           headers=s.auth(user))
+
+
+def _feedback_body(s):
+    from bench.dataset import RELATIONS, random_text
+    return {'feedback_text': random_text(s.rng), 'anon_identifier': s.rng.choice(RELATIONS),
+            'context_text': random_text(s.rng, 0, 15) or None}
+
+
+def scenario_submit(s):
+    user = s.pick_user()
+    s.call('submit', 'POST', f'/api/feedback/{s.identifier(user)}', body=_feedback_body(s))
+
+
+def scenario_stream(s):
+    # Timed until the last SSE event, i.e. including the (fake) LLM call
+    user = s.pick_user()
+    s.call('stream', 'POST', f'/api/feedback/{s.identifier(user)}/stream', body=_feedback_body(s))
+
+
+def scenario_login(s):
+    from bench.dataset import BENCH_PASSWORD
+    user = s.pick_user()
+    s.call('login', 'POST', '/api/auth/login', body={'identifier': user.username, 'password': BENCH_PASSWORD})
+
+
+def scenario_refresh(s):
+    user = s.pick_user()
+    s.call('refresh', 'POST', '/api/auth/refresh', body={'refresh_token': s.tokens[user.id]['refresh_token']})
+
+
+def scenario_register(s):
+    s.registered += 1
+    name = f'load{threading.get_ident() % 100000:05d}{s.registered:05d}{s.rng.randrange(10 ** 6):06d}'
+    s.call('register', 'POST', '/api/auth/register',
+           body={'username': name, 'email': f'{name}@example.com', 'password': 'load-password'})
+
+
+def scenario_healthz(s):
+    s.call('healthz', 'GET', '/healthz')
+
+
+def scenario_readyz(s):
+    s.call('readyz', 'GET', '/readyz')
+
+
+def scenario_metrics(s):
+    s.call('metrics', 'GET', '/metrics')
+
+
+SCENARIOS = {name[len('scenario_'):]: fn for name, fn in globals().items() if name.startswith('scenario_')}
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(-(-pct * len(sorted_values) // 100)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(recorder, wall_seconds):
+    endpoints = {}
+    all_latencies = []
+    for name in sorted(recorder.latencies):
+        latencies = sorted(recorder.latencies[name])
+        all_latencies.extend(latencies)
+        statuses = recorder.statuses[name]
+        errors = sum(n for status, n in statuses.items() if status == 'exception' or status >= 500)
+        endpoints[name] = {
+            'requests': len(latencies),
+            'errors': errors,
+            'statuses': {str(status): n for status, n in sorted(statuses.items(), key=lambda item: str(item[0]))},
+            'throughput_rps': round(len(latencies) / wall_seconds, 2),
+            **_latency_ms(latencies),
+        }
+    all_latencies.sort()
+    total = {
+        'requests': len(all_latencies),
+        'errors': sum(e['errors'] for e in endpoints.values()),
+        'throughput_rps': round(len(all_latencies) / wall_seconds, 2),
+        **_latency_ms(all_latencies),
+    }
+    return endpoints, total
+
+
+def _latency_ms(sorted_seconds):
+    if not sorted_seconds:
+        return {}
+    ms = lambda value: round(value * 1000, 3)
+    return {
+        'p50_ms': ms(percentile(sorted_seconds, 50)),
+        'p95_ms': ms(percentile(sorted_seconds, 95)),
+        'p99_ms': ms(percentile(sorted_seconds, 99)),
+        'mean_ms': ms(sum(sorted_seconds) / len(sorted_seconds)),
+        'max_ms': ms(sorted_seconds[-1]),
+    }
+
+
+def _start_worker(app, stop):
+    from app.utils.enrichment import run_worker
+    processed = [0]
+
+    def loop():
+        while not stop.is_set():
+            processed[0] += run_worker(app, once=True, poll_interval=0.05)
+            stop.wait(0.2)
+
+    thread = threading.Thread(target=loop, name='bench-worker', daemon=True)
+    thread.start()
+    return thread, processed
+
+
+def run(args):
+    configure_environment(args)
+    from app import create_app, db
+    from app.utils.auth import issue_tokens
+    from bench import dataset
+
+    app = create_app()
+    dataset_summary = None
+    with app.app_context():
+        if args.reset:
+            dataset_summary = dataset.reset_and_seed(args.users, args.feedbacks_per_user, args.skew, args.seed)
+        users = dataset.bench_users()
+        if not users:
+            raise SystemExit("No bench users in this database; run with --reset to seed it")
+        tokens = {user.id: issue_tokens(user) for user in users}
+        dialect = db.engine.dialect.name
+
+    mix = parse_mix(args.mix)
+    names = list(mix)
+    cum_mix = list(itertools.accumulate(mix[name] for name in names))
+    user_weights = list(itertools.accumulate(1 / (rank ** args.skew) for rank in range(1, len(users) + 1)))
+
+    recorder = Recorder()
+    # One step counter per phase (warmup, measured), shared by all threads
+    phases = ((itertools.count(), args.warmup), (itertools.count(), args.requests))
+    started = []
+
+    def start_measuring():
+        recorder.enabled = True
+        started.append(time.perf_counter())
+
+    # Every thread finishes the warmup before the first measured request
+    warmup_done = threading.Barrier(args.concurrency, action=start_measuring)
+
+    def client_thread(index):
+        client = HttpClient(args.url) if args.url else InProcessClient(app)
+        rng = random.Random(args.seed * 1000 + index)
+        session = Session(client, recorder, users, user_weights, tokens, rng)
+        for phase, (steps, total_steps) in enumerate(phases):
+            if phase == 1:
+                warmup_done.wait()
+            while next(steps) < total_steps:
+                scenario = rng.choices(names, cum_weights=cum_mix)[0]
+                SCENARIOS[scenario](session)
+
+    stop_worker = threading.Event()
+    worker = _start_worker(app, stop_worker) if args.worker else None
+
+    threads = [threading.Thread(target=client_thread, args=(i,), name=f'bench-client-{i}')
+               for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started[0]
+    if worker is not None:
+        stop_worker.set()
+        worker[0].join()
+
+    endpoints, total = summarize(recorder, wall)
+    return {
+        'config': {
+            'database': dialect,
+            'mode': 'http' if args.url else 'in-process',
+            'url': args.url,
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'mix': mix,
+            'llm_latency_ms': args.llm_latency_ms,
+            'llm_error_rate': args.llm_error_rate,
+            'worker': args.worker,
+            'spam_filter': args.spam_filter,
+            'seed': args.seed,
+            'skew': args.skew,
+        },
+        'dataset': dataset_summary or {'users': len(users), 'seeded': False},
+        'environment': {'python': platform.python_version(), 'platform': platform.platform()},
+        'duration_seconds': round(wall, 3),
+        'total': total,
+        'endpoints': endpoints,
+        'exceptions': dict(recorder.exceptions),
+        'worker_jobs_processed': worker[1][0] if worker is not None else None,
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report + '\n')
+    else:
+        sys.stdout.write(report + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Micro-benchmarks of the helpers on the hot request paths, with timeit.
+
+Pure-Python helpers always run. The database benchmarks (identifier lookup, feedback
+page, stats, search) run against --database-url when it holds the bench dataset:
+seed it with --reset or with bench/load.py first. Prints JSON with the best and
+median time per call in microseconds.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import timeit
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL', 'sqlite:////tmp/jujurly-bench.db'))
+    parser.add_argument('--reset', action='store_true', help='Drop and recreate the tables, then seed.')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--feedbacks-per-user', type=float, default=20)
+    parser.add_argument('--skew', type=float, default=1.1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=5, help='timeit repeats; best and median are reported.')
+    parser.add_argument('--min-time', type=float, default=0.2, help='Seconds per repeat, roughly.')
+    parser.add_argument('--output', default=None)
+    return parser.parse_args(argv)
+
+
+def measure(fn, repeat, min_time):
+    """Best and median seconds per call of fn()."""
+    timer = timeit.Timer(fn)
+    loops, elapsed = timer.autorange()
+    loops = max(1, int(loops * min_time / max(elapsed, 1e-9)))
+    per_call = [t / loops for t in timer.repeat(repeat=repeat, number=loops)]
+    return {
+        'loops': loops,
+        'best_us': round(min(per_call) * 1e6, 3),
+        'median_us': round(statistics.median(per_call) * 1e6, 3),
+    }
+
+
+def python_benchmarks(rng):
+    from app.model import utcnow
+    from app.utils import llm_handler, spam
+    from app.utils.pagination import decode_cursor, encode_cursor
+    from app.utils.response_cache import make_etag
+    from bench.dataset import random_text
+
+    text = random_text(rng, 60, 60)
+    other = random_text(rng, 60, 60)
+    sig_a, sig_b = spam.signature(text), spam.signature(other)
+    cursor = encode_cursor(utcnow(), 12345)
+    item = {'anon_identifier': 'rekan kerja', 'feedback_text': text, 'context_text': other}
+    response = json.dumps({'sentiment': 'Netral Aja', 'summary': text, 'constructiveCriticism': other})
+    return {
+        'spam_signature': lambda: spam.signature(text),
+        'spam_similarity': lambda: spam.similarity(sig_a, sig_b),
+        'cursor_encode': lambda: encode_cursor(utcnow(), 12345),
+        'cursor_decode': lambda: decode_cursor(cursor),
+        'etag': lambda: make_etag(1, 42, cursor, 20),
+        'llm_build_user_message': lambda: llm_handler.build_user_message(item),
+        'llm_parse_response': lambda: llm_handler.parse_llm_response(response),
+    }
+
+
+def database_benchmarks():
+    from app import db
+    from app.model import Feedback
+    from app.utils import identifier
+    from app.utils.search import search_feedback
+    from app.utils.stats import feedback_version, user_stats
+    from bench.dataset import bench_users
+
+    users = bench_users()
+    if not users:
+        return {}
+    busiest, typical = users[0], users[len(users) // 2]
+
+    def lookup_miss():
+        identifier._user_cache.clear()
+        identifier.resolve_user(typical.link_id)
+
+    def feedback_page(user_id):
+        return lambda: db.session.execute(
+            db.select(Feedback.id, Feedback.created_at, Feedback.sentiment, Feedback.summary)
+            .where(Feedback.user_id == user_id)
+            .order_by(Feedback.created_at.desc(), Feedback.id.desc())
+            .limit(21)
+        ).all()
+
+    return {
+        'lookup_cached': lambda: identifier.resolve_user(typical.username),
+        'lookup_uncached': lookup_miss,
+        'feedback_page_busiest_user': feedback_page(busiest.id),
+        'feedback_page_typical_user': feedback_page(typical.id),
+        'feedback_version': lambda: feedback_version(busiest.id),
+        'user_stats_busiest_user': lambda: user_stats(busiest.id, 30),
+        'search_busiest_user': lambda: search_feedback(busiest.id, 'presentasi', 20),
+    }
+
+
+def run(args):
+    from bench.load import configure_environment
+    args.llm_latency_ms, args.llm_error_rate, args.spam_filter = 0, 0.0, False
+    configure_environment(args)
+    from app import create_app, db
+    from bench import dataset
+
+    rng = random.Random(args.seed)
+    app = create_app()
+    results = {}
+    with app.app_context():
+        if args.reset:
+            dataset.reset_and_seed(args.users, args.feedbacks_per_user, args.skew, args.seed)
+        benchmarks = {**python_benchmarks(rng), **database_benchmarks()}
+        for name, fn in benchmarks.items():
+            results[name] = measure(fn, args.repeat, args.min_time)
+        dialect = db.engine.dialect.name
+    return {
+        'config': {'database': dialect, 'repeat': args.repeat, 'seed': args.seed},
+        'environment': {'python': platform.python_version(), 'platform': platform.platform()},
+        'benchmarks': results,
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report + '\n')
+    else:
+        sys.stdout.write(report + '\n')
+
+
+if __name__ == '__main__':
+    main()
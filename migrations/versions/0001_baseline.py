@@ -0,0 +1,52 @@
+"""baseline: user and feedback as created by the original code
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-17 09:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_baseline'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'user',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=80), nullable=False),
+        sa.Column('email', sa.String(length=120), nullable=False),
+        sa.Column('password_hash', sa.String(length=256), nullable=False),
+        sa.Column('link_id', sa.String(length=80), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email'),
+        sa.UniqueConstraint('link_id'),
+        sa.UniqueConstraint('username'),
+    )
+    op.create_table(
+        'feedback',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('anon_identifier', sa.String(length=200), nullable=True),
+        sa.Column('feedback_text', sa.Text(), nullable=False),
+        sa.Column('context_text', sa.Text(), nullable=True),
+        sa.Column('anon_email', sa.String(length=120), nullable=True),
+        sa.Column('summary', sa.Text(), nullable=True),
+        sa.Column('sentiment', sa.String(length=50), nullable=True),
+        sa.Column('constructive_criticism', sa.Text(), nullable=True),
+        sa.Column('is_read', sa.Boolean(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade():
+    op.drop_table('feedback')
+    op.drop_table('user')
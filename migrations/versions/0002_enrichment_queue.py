@@ -0,0 +1,43 @@
+"""enrichment queue: feedback.enrichment_status and the enrichment_job table
+
+Revision ID: 0002_enrichment_queue
+Revises: 0001_baseline
+Create Date: 2026-10-17 09:01:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_enrichment_queue'
+down_revision = '0001_baseline'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows were summarized inline when submitted, hence 'done'
+    op.add_column('feedback', sa.Column('enrichment_status', sa.String(length=20), server_default='done',
+                                        nullable=False))
+    op.create_table(
+        'enrichment_job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('feedback_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('locked_at', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['feedback_id'], ['feedback.id'], name='enrichment_job_feedback_id_fkey'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('feedback_id'),
+    )
+    op.create_index('ix_enrichment_job_status_next_attempt', 'enrichment_job', ['status', 'next_attempt_at'])
+
+
+def downgrade():
+    op.drop_index('ix_enrichment_job_status_next_attempt', table_name='enrichment_job')
+    op.drop_table('enrichment_job')
+    op.drop_column('feedback', 'enrichment_status')
@@ -0,0 +1,24 @@
+"""index for newest-first keyset listing of a user's feedback
+
+Revision ID: 0003_feedback_listing_index
+Revises: 0002_enrichment_queue
+Create Date: 2026-10-17 09:02:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_feedback_listing_index'
+down_revision = '0002_enrichment_queue'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_feedback_user_created', 'feedback', ['user_id', 'created_at', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_feedback_user_created', table_name='feedback')
@@ -0,0 +1,27 @@
+"""record which model and prompt produced each summary
+
+Revision ID: 0005_summary_versions
+Revises: 0004_llm_result_cache
+Create Date: 2026-10-17 09:04:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_summary_versions'
+down_revision = '0004_llm_result_cache'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Left NULL on existing rows: `flask enrichment backfill --scope stale` re-enriches them
+    op.add_column('feedback', sa.Column('summary_model_version', sa.String(length=100), nullable=True))
+    op.add_column('feedback', sa.Column('summary_prompt_version', sa.String(length=20), nullable=True))
+
+
+def downgrade():
+    op.drop_column('feedback', 'summary_prompt_version')
+    op.drop_column('feedback', 'summary_model_version')
@@ -0,0 +1,66 @@
+"""per-user feedback aggregates, filled from the existing feedback
+
+Revision ID: 0006_user_feedback_stats
+Revises: 0005_summary_versions
+Create Date: 2026-10-17 09:05:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_user_feedback_stats'
+down_revision = '0005_summary_versions'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'user_feedback_stats',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.Column('unread', sa.Integer(), nullable=False),
+        sa.Column('last_feedback_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('user_id'),
+    )
+    op.create_table(
+        'user_sentiment_count',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('sentiment', sa.String(length=50), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('user_id', 'sentiment'),
+    )
+    op.create_table(
+        'user_feedback_daily',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('user_id', 'day'),
+    )
+    # Same aggregates as `flask stats rebuild`; the app keeps them current from here on
+    op.execute(
+        "INSERT INTO user_feedback_stats (user_id, total, unread, last_feedback_at) "
+        "SELECT user_id, count(*), sum(CASE WHEN is_read THEN 0 ELSE 1 END), max(created_at) "
+        "FROM feedback GROUP BY user_id"
+    )
+    op.execute(
+        "INSERT INTO user_sentiment_count (user_id, sentiment, count) "
+        "SELECT user_id, sentiment, count(*) FROM feedback WHERE sentiment IS NOT NULL "
+        "GROUP BY user_id, sentiment"
+    )
+    op.execute(
+        "INSERT INTO user_feedback_daily (user_id, day, count) "
+        "SELECT user_id, date(created_at), count(*) FROM feedback WHERE created_at IS NOT NULL "
+        "GROUP BY user_id, date(created_at)"
+    )
+
+
+def downgrade():
+    op.drop_table('user_feedback_daily')
+    op.drop_table('user_sentiment_count')
+    op.drop_table('user_feedback_stats')
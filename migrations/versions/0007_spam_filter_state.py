@@ -0,0 +1,43 @@
+"""shared spam filter state: rate limit buckets and feedback signatures
+
+Revision ID: 0007_spam_filter_state
+Revises: 0006_user_feedback_stats
+Create Date: 2026-10-17 09:06:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007_spam_filter_state'
+down_revision = '0006_user_feedback_stats'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'rate_limit_bucket',
+        sa.Column('key', sa.String(length=80), nullable=False),
+        sa.Column('tokens', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('key'),
+    )
+    op.create_table(
+        'feedback_signature',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('client_key', sa.String(length=32), nullable=False),
+        sa.Column('feedback_id', sa.Integer(), nullable=False),
+        sa.Column('signature', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_feedback_signature_sender', 'feedback_signature', ['user_id', 'client_key', 'created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_feedback_signature_sender', table_name='feedback_signature')
+    op.drop_table('feedback_signature')
+    op.drop_table('rate_limit_bucket')
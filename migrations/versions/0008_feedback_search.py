@@ -0,0 +1,65 @@
+"""full-text search index over feedback
+
+Revision ID: 0008_feedback_search
+Revises: 0007_spam_filter_state
+Create Date: 2026-10-17 09:07:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008_feedback_search'
+down_revision = '0007_spam_filter_state'
+branch_labels = None
+depends_on = None
+
+# DDL as in app/utils/search.py at this revision; feedback still holds the raw text
+PG_DOCUMENT = (
+    "to_tsvector('simple'::regconfig, coalesce(feedback_text, '') || ' ' || "
+    "coalesce(summary, '') || ' ' || coalesce(constructive_criticism, ''))"
+)
+FTS_COLUMNS = "owner, feedback_text, summary, constructive_criticism"
+
+
+def _fts_values(row):
+    return (f"{row}.id, 'u' || {row}.user_id, {row}.feedback_text, coalesce({row}.summary, ''), "
+            f"coalesce({row}.constructive_criticism, '')")
+
+
+SQLITE_DDL = [
+    f"CREATE VIRTUAL TABLE feedback_fts USING fts5({FTS_COLUMNS}, content='', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    f"""CREATE TRIGGER feedback_fts_insert AFTER INSERT ON feedback BEGIN
+        INSERT INTO feedback_fts(rowid, {FTS_COLUMNS}) VALUES ({_fts_values('new')});
+    END""",
+    f"""CREATE TRIGGER feedback_fts_delete AFTER DELETE ON feedback BEGIN
+        INSERT INTO feedback_fts(feedback_fts, rowid, {FTS_COLUMNS}) VALUES ('delete', {_fts_values('old')});
+    END""",
+    f"""CREATE TRIGGER feedback_fts_update
+        AFTER UPDATE OF user_id, feedback_text, summary, constructive_criticism ON feedback BEGIN
+        INSERT INTO feedback_fts(feedback_fts, rowid, {FTS_COLUMNS}) VALUES ('delete', {_fts_values('old')});
+        INSERT INTO feedback_fts(rowid, {FTS_COLUMNS}) VALUES ({_fts_values('new')});
+    END""",
+    f"INSERT INTO feedback_fts(rowid, {FTS_COLUMNS}) SELECT {_fts_values('feedback')} FROM feedback",
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute(f"CREATE INDEX ix_feedback_search ON feedback USING GIN ({PG_DOCUMENT})")
+    elif dialect == 'sqlite':
+        for statement in SQLITE_DDL:
+            op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX ix_feedback_search")
+    elif dialect == 'sqlite':
+        for trigger in ('feedback_fts_insert', 'feedback_fts_delete', 'feedback_fts_update'):
+            op.execute(f"DROP TRIGGER {trigger}")
+        op.execute("DROP TABLE feedback_fts")
@@ -0,0 +1,26 @@
+"""version stamp of each user's feedback, for list ETags
+
+Revision ID: 0009_feedback_list_version
+Revises: 0008_feedback_search
+Create Date: 2026-10-17 09:08:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009_feedback_list_version'
+down_revision = '0008_feedback_search'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('user_feedback_stats', sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('user_feedback_stats', sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('user_feedback_stats', 'updated_at')
+    op.drop_column('user_feedback_stats', 'version')
@@ -0,0 +1,179 @@
+"""raw feedback text in feedback_content, feedback_archive
+
+Revision ID: 0010_feedback_storage
+Revises: 0009_feedback_list_version
+Create Date: 2026-10-17 09:10:00
+
+On Postgres this leaves feedback a plain table; turning it into the range-partitioned
+one is `flask feedback migrate-storage` (app/utils/storage_migration.py), run after it.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010_feedback_storage'
+down_revision = '0009_feedback_list_version'
+branch_labels = None
+depends_on = None
+
+# DDL as in app/utils/search.py at this revision; the raw text is in feedback_content
+PG_FEEDBACK_DOCUMENT = "to_tsvector('simple'::regconfig, coalesce(summary, '') || ' ' || coalesce(constructive_criticism, ''))"
+PG_CONTENT_DOCUMENT = "to_tsvector('simple'::regconfig, feedback_text)"
+# As in 0008_feedback_search, for the downgrade
+PG_OLD_DOCUMENT = (
+    "to_tsvector('simple'::regconfig, coalesce(feedback_text, '') || ' ' || "
+    "coalesce(summary, '') || ' ' || coalesce(constructive_criticism, ''))"
+)
+FTS_COLUMNS = "owner, feedback_text, summary, constructive_criticism"
+OLD_TRIGGERS = ('feedback_fts_insert', 'feedback_fts_delete', 'feedback_fts_update')
+NEW_TRIGGERS = ('feedback_content_fts_insert', 'feedback_content_fts_update', 'feedback_content_fts_delete',
+                'feedback_fts_update_summary', 'feedback_fts_delete_row')
+
+
+def _fts_values(row, content):
+    return (f"{row}.id, 'u' || {row}.user_id, {content}.feedback_text, coalesce({row}.summary, ''), "
+            f"coalesce({row}.constructive_criticism, '')")
+
+
+def _content_values(content):
+    return (f"f.id, 'u' || f.user_id, {content}.feedback_text, coalesce(f.summary, ''), "
+            f"coalesce(f.constructive_criticism, '')")
+
+
+SQLITE_TRIGGERS = [
+    f"""CREATE TRIGGER feedback_content_fts_insert AFTER INSERT ON feedback_content BEGIN
+        INSERT INTO feedback_fts(rowid, {FTS_COLUMNS}) SELECT {_content_values('new')} FROM feedback f WHERE f.id = new.feedback_id;
+    END""",
+    f"""CREATE TRIGGER feedback_content_fts_update AFTER UPDATE OF feedback_text ON feedback_content BEGIN
+        INSERT INTO feedback_fts(feedback_fts, rowid, {FTS_COLUMNS}) SELECT 'delete', {_content_values('old')} FROM feedback f WHERE f.id = old.feedback_id;
+        INSERT INTO feedback_fts(rowid, {FTS_COLUMNS}) SELECT {_content_values('new')} FROM feedback f WHERE f.id = new.feedback_id;
+    END""",
+    f"""CREATE TRIGGER feedback_content_fts_delete AFTER DELETE ON feedback_content BEGIN
+        INSERT INTO feedback_fts(feedback_fts, rowid, {FTS_COLUMNS}) SELECT 'delete', {_content_values('old')} FROM feedback f WHERE f.id = old.feedback_id;
+    END""",
+    f"""CREATE TRIGGER feedback_fts_update_summary
+        AFTER UPDATE OF user_id, summary, constructive_criticism ON feedback BEGIN
+        INSERT INTO feedback_fts(feedback_fts, rowid, {FTS_COLUMNS}) SELECT 'delete', {_fts_values('old', 'c')} FROM feedback_content c WHERE c.feedback_id = old.id;
+        INSERT INTO feedback_fts(rowid, {FTS_COLUMNS}) SELECT {_fts_values('new', 'c')} FROM feedback_content c WHERE c.feedback_id = new.id;
+    END""",
+    f"""CREATE TRIGGER feedback_fts_delete_row AFTER DELETE ON feedback BEGIN
+        INSERT INTO feedback_fts(feedback_fts, rowid, {FTS_COLUMNS}) SELECT 'delete', {_fts_values('old', 'c')} FROM feedback_content c WHERE c.feedback_id = old.id;
+    END""",
+]
+
+# As in 0008_feedback_search, for the downgrade
+SQLITE_OLD_TRIGGERS = [
+    f"""CREATE TRIGGER feedback_fts_insert AFTER INSERT ON feedback BEGIN
+        INSERT INTO feedback_fts(rowid, {FTS_COLUMNS}) VALUES ({_fts_values('new', 'new')});
+    END""",
+    f"""CREATE TRIGGER feedback_fts_delete AFTER DELETE ON feedback BEGIN
+        INSERT INTO feedback_fts(feedback_fts, rowid, {FTS_COLUMNS}) VALUES ('delete', {_fts_values('old', 'old')});
+    END""",
+    f"""CREATE TRIGGER feedback_fts_update
+        AFTER UPDATE OF user_id, feedback_text, summary, constructive_criticism ON feedback BEGIN
+        INSERT INTO feedback_fts(feedback_fts, rowid, {FTS_COLUMNS}) VALUES ('delete', {_fts_values('old', 'old')});
+        INSERT INTO feedback_fts(rowid, {FTS_COLUMNS}) VALUES ({_fts_values('new', 'new')});
+    END""",
+]
+
+
+def _refill_fts(source):
+    # The FTS table is contentless: it can't be emptied row by row, only dropped and refilled
+    op.execute("INSERT INTO feedback_fts(feedback_fts) VALUES ('delete-all')")
+    op.execute(f"INSERT INTO feedback_fts(rowid, {FTS_COLUMNS}) {source}")
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    op.create_table(
+        'feedback_content',
+        sa.Column('feedback_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('feedback_text', sa.Text(), nullable=False),
+        sa.Column('context_text', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('feedback_id'),
+    )
+    op.execute("INSERT INTO feedback_content (feedback_id, feedback_text, context_text) "
+               "SELECT id, feedback_text, context_text FROM feedback")
+    op.create_table(
+        'feedback_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('sentiment', sa.String(length=50), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.Column('payload', sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_feedback_archive_user_created', 'feedback_archive', ['user_id', 'created_at', 'id'])
+
+    # Nothing references feedback.id with a foreign key any more, so it can be partitioned
+    with op.batch_alter_table('enrichment_job') as batch_op:
+        batch_op.drop_constraint('enrichment_job_feedback_id_fkey', type_='foreignkey')
+
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX ix_feedback_search")
+    elif dialect == 'sqlite':
+        # They read feedback.feedback_text, which is about to go
+        for trigger in OLD_TRIGGERS:
+            op.execute(f"DROP TRIGGER {trigger}")
+
+    # created_at becomes the partition key on Postgres, so it can't be NULL
+    op.execute("UPDATE feedback SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+    with op.batch_alter_table('feedback') as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.drop_column('context_text')
+        batch_op.drop_column('feedback_text')
+
+    if dialect == 'postgresql':
+        op.execute(f"CREATE INDEX ix_feedback_search ON feedback USING GIN ({PG_FEEDBACK_DOCUMENT})")
+        op.execute(f"CREATE INDEX ix_feedback_content_search ON feedback_content USING GIN ({PG_CONTENT_DOCUMENT})")
+    elif dialect == 'sqlite':
+        for statement in SQLITE_TRIGGERS:
+            op.execute(statement)
+        _refill_fts(f"SELECT {_content_values('c')} FROM feedback f JOIN feedback_content c ON c.feedback_id = f.id")
+
+
+def downgrade():
+    bind = op.get_bind()
+    dialect = bind.dialect.name
+    if dialect == 'postgresql' and bind.scalar(sa.text(
+            "SELECT relkind = 'p' FROM pg_class WHERE oid = 'feedback'::regclass")):
+        raise RuntimeError("feedback is partitioned; run `flask feedback migrate-storage --i-have-a-backup --rollback` first")
+    if bind.scalar(sa.text("SELECT EXISTS (SELECT 1 FROM feedback_archive)")):
+        # The archive payload is the only copy of those rows' text
+        raise RuntimeError("feedback_archive holds rows; restore or export them before downgrading")
+
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX ix_feedback_search")
+    elif dialect == 'sqlite':
+        for trigger in NEW_TRIGGERS:
+            op.execute(f"DROP TRIGGER {trigger}")
+
+    with op.batch_alter_table('feedback') as batch_op:
+        batch_op.add_column(sa.Column('feedback_text', sa.Text(), server_default='', nullable=False))
+        batch_op.add_column(sa.Column('context_text', sa.Text(), nullable=True))
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=True)
+    op.execute("UPDATE feedback SET "
+               "feedback_text = coalesce((SELECT c.feedback_text FROM feedback_content c WHERE c.feedback_id = feedback.id), ''), "
+               "context_text = (SELECT c.context_text FROM feedback_content c WHERE c.feedback_id = feedback.id)")
+    with op.batch_alter_table('feedback') as batch_op:
+        batch_op.alter_column('feedback_text', existing_type=sa.Text(), server_default=None)
+
+    if dialect == 'postgresql':
+        op.execute(f"CREATE INDEX ix_feedback_search ON feedback USING GIN ({PG_OLD_DOCUMENT})")
+    elif dialect == 'sqlite':
+        for statement in SQLITE_OLD_TRIGGERS:
+            op.execute(statement)
+        _refill_fts(f"SELECT {_fts_values('feedback', 'feedback')} FROM feedback")
+
+    # Jobs whose feedback is gone would block the foreign key
+    op.execute("DELETE FROM enrichment_job WHERE feedback_id NOT IN (SELECT id FROM feedback)")
+    with op.batch_alter_table('enrichment_job') as batch_op:
+        batch_op.create_foreign_key('enrichment_job_feedback_id_fkey', 'feedback', ['feedback_id'], ['id'])
+
+    op.drop_index('ix_feedback_archive_user_created', table_name='feedback_archive')
+    op.drop_table('feedback_archive')
+    op.drop_table('feedback_content')
@@ -1,6 +1,18 @@
+import os
+from dotenv import load_dotenv
+
+# Load .env before importing the app: modules read their settings at import time.
+# (The flask CLI loads .env itself.)
+load_dotenv()
+
 from app import create_app
 
 app = create_app()
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    # Development server only; production runs `gunicorn -c gunicorn.conf.py run:app`
+    app.run(
+        host=os.getenv("HOST", "127.0.0.1"),
+        port=int(os.getenv("PORT", "5001")),
+        debug=os.getenv("FLASK_DEBUG", "0") == "1"
+    )
@@ -0,0 +1,42 @@
+import os
+
+# Settings are read at import time: the offline LLM provider, no spam filter, a fixed key
+os.environ.update({
+    'MODEL_TYPE': 'fake',
+    'LLM_PROVIDERS': 'fake',
+    'FAKE_LLM_LATENCY_MS': '0',
+    'SPAM_FILTER_ENABLED': '0',
+    'SECRET_KEY': 'test-secret',
+    'METRICS_ENABLED': '0',
+})
+
+import pytest
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'test.db'}")
+    from app import create_app, db
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Registers `username` and returns Authorization headers for it."""
+    def register(username, password='pw'):
+        client.post('/api/auth/register', json={'username': username, 'email': f'{username}@example.com',
+                                               'password': password})
+        token = client.post('/api/auth/login', json={'identifier': username, 'password': password}).json
+        return {'Authorization': f"Bearer {token['access_token']}"}
+    return register
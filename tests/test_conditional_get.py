@@ -0,0 +1,17 @@
+def test_feedback_list_revalidates_with_etag(client, auth_headers):
+    headers = auth_headers('bob')
+    client.post('/api/feedback/bob', json={'feedback_text': 'kelas sangat ramai hari ini'})
+
+    first = client.get('/api/users/bob/feedbacks', headers=headers)
+    assert first.status_code == 200
+    assert 'Last-Modified' not in first.headers
+    etag = first.headers['ETag']
+
+    unchanged = client.get('/api/users/bob/feedbacks', headers={**headers, 'If-None-Match': etag})
+    assert unchanged.status_code == 304
+
+    client.post('/api/feedback/bob', json={'feedback_text': 'materi presentasi kurang jelas'})
+    changed = client.get('/api/users/bob/feedbacks', headers={**headers, 'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert len(changed.json) == 2
+    assert changed.headers['ETag'] != etag
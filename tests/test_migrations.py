@@ -0,0 +1,58 @@
+import pytest
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from flask_migrate import downgrade, upgrade
+from sqlalchemy import text
+
+
+@pytest.fixture
+def empty_app(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'migrated.db'}")
+    from app import create_app, db
+    app = create_app()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _schema_diff(db):
+    def include_object(obj, name, type_, reflected, compare_to):
+        # The FTS5 table and its shadow tables are raw DDL, not in the models
+        return not (type_ == 'table' and name.startswith('feedback_fts'))
+    with db.engine.connect() as connection:
+        context = MigrationContext.configure(connection, opts={'include_object': include_object})
+        return compare_metadata(context, db.metadata)
+
+
+def test_revisions_reach_the_model_schema(empty_app):
+    from app import db
+    with empty_app.app_context():
+        upgrade()
+        assert _schema_diff(db) == []
+
+
+def test_upgrade_keeps_baseline_feedback(empty_app):
+    from app import db
+    with empty_app.app_context():
+        upgrade(revision='0001_baseline')
+        with db.engine.begin() as connection:
+            connection.execute(text(
+                "INSERT INTO user (username, email, password_hash, link_id) VALUES ('bob', 'b@x', 'h', 'l1')"))
+            connection.execute(text(
+                "INSERT INTO feedback (user_id, feedback_text, context_text, is_read, created_at) "
+                "VALUES (1, 'kelas sangat ramai', 'ctx', 0, '2025-03-05 10:00:00'), (1, 'materi kurang jelas', NULL, 1, NULL)"))
+        upgrade()
+        with db.engine.connect() as connection:
+            assert connection.execute(text(
+                "SELECT feedback_id, feedback_text, context_text FROM feedback_content ORDER BY 1")).all() == [
+                (1, 'kelas sangat ramai', 'ctx'), (2, 'materi kurang jelas', None)]
+            assert connection.execute(text(
+                "SELECT user_id, total, unread FROM user_feedback_stats")).all() == [(1, 2, 1)]
+            assert connection.scalar(text("SELECT count(*) FROM feedback WHERE created_at IS NULL")) == 0
+            assert connection.scalar(text("SELECT count(*) FROM feedback_fts WHERE feedback_fts MATCH 'ramai'")) == 1
+
+        downgrade(revision='0001_baseline')
+        with db.engine.connect() as connection:
+            assert connection.execute(text("SELECT feedback_text, context_text FROM feedback ORDER BY id")).all() == [
+                ('kelas sangat ramai', 'ctx'), ('materi kurang jelas', None)]
@@ -0,0 +1,32 @@
+import pytest
+
+
+@pytest.fixture
+def bob(client, auth_headers):
+    """Bob's headers and the ids of his two feedback rows."""
+    headers = auth_headers('bob')
+    ids = []
+    for text in ('kelas sangat ramai hari ini', 'materi presentasi kurang jelas'):
+        response = client.post('/api/feedback/bob', json={'feedback_text': text})
+        assert response.status_code == 202
+        ids.append(response.json['feedback_id'])
+    return headers, ids
+
+
+def search(client, headers, query):
+    response = client.get('/api/users/bob/search', query_string={'q': query}, headers=headers)
+    assert response.status_code == 200
+    return [row['id'] for row in response.json]
+
+
+def test_search_matches_word_prefixes(client, bob):
+    headers, (ramai, presentasi) = bob
+    assert search(client, headers, 'presentasi') == [presentasi]
+    assert search(client, headers, 'ram') == [ramai]
+    assert search(client, headers, 'kelas jelas') == []
+
+
+@pytest.mark.parametrize('query', ['u1', 'u', 'owner'])
+def test_search_does_not_match_the_owner_token(client, bob, query):
+    headers, _ = bob
+    assert search(client, headers, query) == []